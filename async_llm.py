@@ -0,0 +1,301 @@
+import asyncio
+import time
+import threading
+from collections import deque
+import httpx
+import ollama
+from typing import cast, Dict, Any
+from llm import LLMHandler, TransientLLMError, DEFAULT_OPENROUTER_MODEL, DEFAULT_OLLAMA_MODEL
+from tokens import count_tokens
+from profiling import span
+
+class AsyncRateLimiter:
+    """Spaces request starts so a backend sees at most `rate` requests per second.
+
+    The next start time is shared under a thread lock, so the rate holds
+    across every thread and event loop using the limiter.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class SharedSemaphore:
+    """Async semaphore whose slots are shared by event loops in different threads.
+
+    asyncio.Semaphore is bound to one loop. Here a released slot is handed
+    straight to the longest waiter on whichever loop it is waiting.
+    """
+
+    def __init__(self, value):
+        self._value = value
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._value > 0 and not self._waiters:
+                self._value -= 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = waiter in self._waiters
+                if queued:
+                    self._waiters.remove(waiter)
+            # A slot granted just before the cancellation must be passed on
+            if not queued and waiter[1].done() and not waiter[1].cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                loop, future = self._waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(self._grant, future)
+                    return
+                except RuntimeError:  # the waiter's loop has closed
+                    continue
+            self._value += 1
+
+    def _grant(self, future):
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+async def _aclose_ollama(client):
+    """Close an ollama.AsyncClient's connection pool.
+
+    Newer ollama releases provide close(); older ones only hold the
+    underlying httpx.AsyncClient as _client.
+    """
+    close = getattr(client, 'close', None)
+    if close is not None:
+        await close()
+        return
+    pool = getattr(client, '_client', None)
+    if pool is not None:
+        await pool.aclose()
+
+class _LoopState:
+    """Event-loop-bound clients and tasks; one per loop using the handler."""
+
+    def __init__(self, handler):
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(handler.timeout[1], connect=handler.timeout[0]),
+            limits=httpx.Limits(max_connections=handler.pool_size,
+                                max_keepalive_connections=handler.pool_size))
+        self.ollama = ollama.AsyncClient()
+        self.tasks = set()
+
+class AsyncLLMHandler(LLMHandler):
+    """LLMHandler with asyncio entry points for running many prompts concurrently.
+
+    Shares configuration, response cache and retry policy with LLMHandler, so
+    the synchronous methods keep working. Concurrency is bounded by a
+    semaphore and each backend can be given a requests-per-second limit.
+    Several threads may each drive their own event loop through one handler
+    (e.g. pipeline stages calling run_batch); clients are per loop, but the
+    concurrency and rate limits are shared by all of them.
+    """
+
+    def __init__(self, openrouter_api_key=None, max_concurrency=4, rate_limits=None,
+                 request_timeout=None, **kwargs):
+        super().__init__(openrouter_api_key, **kwargs)
+        self.max_concurrency = max_concurrency
+        self.rate_limits = rate_limits or {}
+        self._slots = SharedSemaphore(max_concurrency)
+        self.limiters = {backend: AsyncRateLimiter(rate) for backend, rate in self.rate_limits.items()}
+        self.request_timeout = request_timeout
+        self._states = {}
+        self._states_lock = threading.Lock()
+
+    def _state(self):
+        """Return the clients bound to the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._states_lock:
+            state = self._states.get(loop)
+            if state is None:
+                state = self._states[loop] = _LoopState(self)
+            return state
+
+    async def aclose(self):
+        """Close the async HTTP and Ollama clients for the current loop, and the custom backend's."""
+        with self._states_lock:
+            state = self._states.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state.client.aclose()
+            await _aclose_ollama(state.ollama)
+        aclose = getattr(self.backend, 'aclose', None)
+        if aclose is not None:
+            await aclose()
+
+    def cancel(self):
+        """Cancel every in-flight request started by agenerate_many(); safe from any thread."""
+        with self._states_lock:
+            states = list(self._states.items())
+        for loop, state in states:
+            for task in list(state.tasks):
+                loop.call_soon_threadsafe(task.cancel)
+
+    async def _acached_call(self, backend, model, prompt, params, call):
+        """Async counterpart of LLMHandler._cached_call."""
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(backend, model, prompt, params)
+            if not self.refresh_cache:
+                response = await asyncio.to_thread(self.cache.get, key)
+                if response is not None:
+                    self._record_cache_hit()
+                    return response
+        response = await call()
+        self._record_usage(count_tokens(prompt), count_tokens(response))
+        if key is not None:
+            await asyncio.to_thread(self.cache.set, key, response)
+        return response
+
+    async def _throttle(self, backend):
+        limiter = self.limiters.get(backend)
+        if limiter is not None:
+            await limiter.wait()
+
+    async def agenerate_with_openrouter(self, prompt, model=DEFAULT_OPENROUTER_MODEL):
+        """Generate text using OpenRouter over a pooled async HTTP client."""
+        client = self._state().client
+        headers = {
+            "Authorization": f"Bearer {self.openrouter_api_key}",
+            "Content-Type": "application/json"
+        }
+        data = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": self._max_tokens(model, prompt)
+        }
+
+        async def call():
+            attempt = 0
+            while True:
+                await self._throttle('openrouter')
+                try:
+                    response = await client.post(self.openrouter_url, headers=headers, json=data)
+                    self._check_openrouter_response(response)
+                    return response.json()['choices'][0]['message']['content']
+                except (httpx.TransportError, httpx.TimeoutException) as e:
+                    error = TransientLLMError(f"OpenRouter connection error: {e}")
+                except TransientLLMError as e:
+                    error = e
+                await asyncio.sleep(self._retry_delay(error, attempt))
+                attempt += 1
+
+        return await self._acached_call('openrouter', model, prompt, {'max_tokens': data['max_tokens']}, call)
+
+    async def agenerate_with_ollama(self, prompt, model=DEFAULT_OLLAMA_MODEL):
+        """Generate text using the async Ollama client."""
+        client = self._state().ollama
+        request = self._ollama_request(model, prompt)
+
+        async def call():
+            await self._throttle('ollama')
+            try:
+                response = await client.generate(**request)
+                return cast(Dict[str, Any], response)['response']
+            except Exception as e:
+                raise Exception(f"Ollama error: {e}")
+
+        return await self._acached_call('ollama', model, prompt, self._ollama_params(request), call)
+
+    async def agenerate_with_backend(self, prompt):
+        """Generate text using the configured custom backend."""
+        backend = self.backend
+        self._max_tokens(backend.model, prompt)
+
+        async def call():
+            await self._throttle(backend.name)
+            agenerate = getattr(backend, 'agenerate', None)
+            if agenerate is not None:
+                return await agenerate(prompt)
+            return await asyncio.to_thread(backend.generate, prompt)
+
+        return await self._acached_call(backend.name, backend.model, prompt, {}, call)
+
+    async def _agenerate(self, prompt):
+        with span('AsyncLLMHandler.agenerate') as stats:
+            if self.backend is not None:
+                response = await self.agenerate_with_backend(prompt)
+                backend = self.backend.name
+            elif self.openrouter_api_key:
+                try:
+                    response = await self.agenerate_with_openrouter(prompt)
+                    backend = 'openrouter'
+                except Exception as e:
+                    print(f"OpenRouter failed ({e}), falling back to Ollama.")
+                    response = await self.agenerate_with_ollama(prompt)
+                    backend = 'ollama'
+            else:
+                response = await self.agenerate_with_ollama(prompt)
+                backend = 'ollama'
+            self.describe_call(stats, backend, prompt, response)
+        return response
+
+    async def agenerate(self, prompt):
+        """Generate text with the same OpenRouter-then-Ollama fallback as generate().
+
+        request_timeout bounds the call once it holds a concurrency slot, not
+        the wait for one.
+        """
+        async with self._slots:
+            if self.request_timeout:
+                return await asyncio.wait_for(self._agenerate(prompt), self.request_timeout)
+            return await self._agenerate(prompt)
+
+    async def agenerate_many(self, prompts, return_exceptions=False):
+        """Run prompts concurrently and return responses in input order.
+
+        With return_exceptions=False the first failure cancels the remaining
+        requests and is re-raised.
+        """
+        state = self._state()
+        tasks = [asyncio.ensure_future(self.agenerate(prompt)) for prompt in prompts]
+        state.tasks.update(tasks)
+        try:
+            return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            state.tasks.difference_update(tasks)
+
+    def run_batch(self, prompts, return_exceptions=False):
+        """Synchronous entry point: run prompts concurrently on a fresh event loop."""
+        async def runner():
+            try:
+                return await self.agenerate_many(prompts, return_exceptions)
+            finally:
+                await self.aclose()
+
+        return asyncio.run(runner())
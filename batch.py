@@ -0,0 +1,173 @@
+import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from main import (add_runtime_arguments, create_document_parser, create_llm, create_classifier,
+                  parse_files, assemble_corpus, build_prompt, generate_sections, render_if_changed,
+                  print_token_usage, print_route_stats, warm_up, start_profiling, finish_profiling)
+from generator import MagazineGenerator
+from pipeline import Pipeline, Stage
+from build import BuildManifest
+
+try:
+    import yaml
+except ImportError:  # YAML manifests are optional; JSON always works
+    yaml = None
+
+def load_manifest(manifest_path):
+    """Load a JSON or YAML edition manifest and resolve paths relative to it.
+
+    Expected layout:
+        {"defaults": {"theme": "professional"},
+         "editions": [{"name": "cse", "files": ["cse.pdf"], "theme": "academic",
+                       "output": "out/cse.pdf"}]}
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as file:
+        if manifest_path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ValueError("PyYAML is required for YAML manifests (pip install pyyaml)")
+            manifest = yaml.safe_load(file)
+        else:
+            manifest = json.load(file)
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    defaults = manifest.get('defaults', {})
+    editions = []
+    for index, entry in enumerate(manifest.get('editions', [])):
+        edition = {**defaults, **entry}
+        if not edition.get('files'):
+            raise ValueError(f"Edition {index} in {manifest_path} has no input files")
+        edition.setdefault('name', f"edition-{index + 1}")
+        edition.setdefault('theme', 'professional')
+        edition.setdefault('output', f"{edition['name']}.pdf")
+        edition['files'] = [os.path.join(base_dir, path) for path in edition['files']]
+        edition['output'] = os.path.join(base_dir, edition['output'])
+        editions.append(edition)
+    return editions
+
+def run_batch(editions, doc_parser, llm, jobs=1, context_tokens=None, chunk_workers=4, queue_size=2,
+              incremental=False, per_section=False, prompt_budget=None, classifier=None, refresh=False,
+              style_prompt=False):
+    """Build every edition through a parse -> prompt -> generate -> render pipeline.
+
+    Stages overlap: while one edition waits on the LLM the next is being parsed
+    and the previous one rendered. The parser, LLM handler and per-theme
+    generators are shared by all editions. With incremental=True each
+    edition keeps a BuildManifest next to its output and skips parsing
+    unchanged files, unchanged LLM calls and renders; refresh=True regenerates every LLM output while
+    still recording it. With per_section=True each edition is generated
+    as concurrent per-section calls instead of one prompt; otherwise
+    prompt_budget limits the source text in each prompt to the most relevant
+    passages. A ContentClassifier passed as classifier replaces the built-in
+    content taxonomy. With style_prompt=True the prompts ask for the
+    edition's theme style. Returns a list of
+    (edition name, output path or None, error or None).
+    """
+    generators = {}
+    pool = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+
+    def parse(edition):
+        print(f"\n[{edition['name']}] Parsing {len(edition['files'])} files...")
+        manifest = BuildManifest.for_output(edition['output']) if incremental else None
+        corpus = assemble_corpus(parse_files(edition['files'], doc_parser, jobs, pool, manifest))
+        if not corpus:
+            raise ValueError("no input files could be parsed")
+        return edition, corpus, manifest
+
+    def prompt(state):
+        edition, corpus, manifest = state
+        file_names = [os.path.basename(path) for path in edition['files']]
+        if per_section:
+            return edition, (corpus, file_names), manifest
+        return edition, build_prompt(llm, corpus, file_names, context_tokens, chunk_workers,
+                                     prompt_budget, classifier,
+                                     edition['theme'] if style_prompt else None), manifest
+
+    def generate(state):
+        edition, request, manifest = state
+        if per_section:
+            print(f"[{edition['name']}] Calling LLM per section...")
+            corpus, file_names = request
+            content = generate_sections(llm, corpus, file_names, context_tokens, chunk_workers, manifest,
+                                        refresh, classifier, edition['theme'] if style_prompt else None)
+            return edition, content, manifest
+        content = manifest.lookup('issue', request) if manifest and not refresh else None
+        if content is None:
+            print(f"[{edition['name']}] Calling LLM...")
+            content = llm.generate(request)
+        else:
+            print(f"[{edition['name']}] Prompt unchanged, reusing LLM output")
+        if manifest:
+            manifest.record('issue', request, content)
+        return edition, content, manifest
+
+    def render(state):
+        edition, content, manifest = state
+        gen = generators.get(edition['theme'])
+        if gen is None:
+            gen = generators[edition['theme']] = MagazineGenerator(theme=edition['theme'])
+        os.makedirs(os.path.dirname(edition['output']) or '.', exist_ok=True)
+        if not render_if_changed(gen, content, edition['output'], edition['theme'], manifest):
+            raise ValueError("unsupported output format")
+        if manifest:
+            manifest.record_files(edition['files'])
+            manifest.save()
+        print(f"[{edition['name']}] Magazine generated as: {edition['output']}")
+        return edition['output']
+
+    # The prompt stage may run a chunked map-reduce on its own event loop, so
+    # it stays single-threaded; generation is where concurrency pays off.
+    pipeline = Pipeline([
+        Stage('parse', parse),
+        Stage('prompt', prompt),
+        Stage('generate', generate, workers=chunk_workers),
+        Stage('render', render),
+    ], queue_size=queue_size)
+    try:
+        outcomes = pipeline.run(editions)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    pipeline.timer.report(pipeline.wall_time)
+
+    results = []
+    for edition, (output, error) in zip(editions, outcomes):
+        if error:
+            print(f"[{edition['name']}] Failed: {error}")
+        results.append((edition['name'], output, error))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Build several magazine editions from a manifest")
+    parser.add_argument('manifest', help='JSON or YAML manifest listing editions')
+    add_runtime_arguments(parser)
+    args = parser.parse_args()
+
+    editions = load_manifest(args.manifest)
+    print(f"Loaded {len(editions)} editions from {args.manifest}")
+    start_profiling(args)
+    doc_parser = create_document_parser(args)
+    llm = create_llm(args)
+    warming = warm_up(llm, args)
+    if warming:
+        warming.join()
+    try:
+        results = run_batch(editions, doc_parser, llm, args.jobs, args.context_tokens, args.chunk_workers,
+                            incremental=args.incremental, per_section=args.per_section,
+                            prompt_budget=args.prompt_budget, classifier=create_classifier(args),
+                            refresh=args.refresh_llm_cache, style_prompt=args.style_prompt)
+    finally:
+        llm.close()
+        doc_parser.close()
+    print_token_usage(llm)
+    print_route_stats(llm)
+    finish_profiling(args)
+
+    failed = [name for name, _, error in results if error]
+    print(f"\n{len(results) - len(failed)} of {len(results)} editions built")
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
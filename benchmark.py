@@ -0,0 +1,163 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+from parser import DocumentParser
+from generator import MagazineGenerator
+from main import detect_content_types, create_dynamic_prompt
+from corpus import Corpus
+from mock_backend import MockBackend
+
+SAMPLE_FILES = ['sample_event.txt', 'cultural_events.txt', 'academic_achievements.txt']
+
+def measure(func, repeat):
+    """Run func repeat times untraced, then once under tracemalloc for peak memory.
+
+    Tracing slows allocation-heavy code several times over, so timings only
+    come from the untraced runs. Returns the stats and the last result.
+    """
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'min_s': min(times),
+        'median_s': statistics.median(times),
+        'peak_mem_mb': peak / (1024 * 1024),
+    }, result
+
+def write_scaled_corpus(directory, scale):
+    """Write one file per sample, each repeated scale times; return their paths."""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    paths = []
+    for name in SAMPLE_FILES:
+        with open(os.path.join(base_dir, name), 'r', encoding='utf-8') as file:
+            text = file.read()
+        path = os.path.join(directory, f"x{scale}_{name}")
+        with open(path, 'w', encoding='utf-8') as file:
+            for _ in range(scale):
+                file.write(text)
+                file.write('\n')
+        paths.append(path)
+    return paths
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def run_benchmarks(scales, repeat, render_max_scale):
+    """Benchmark each pipeline stage at every scale and return the results dict."""
+    doc_parser = DocumentParser(use_cache=False)
+    llm = MockBackend()
+    gen = MagazineGenerator(theme='professional')
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in scales:
+            paths = write_scaled_corpus(tmp, scale)
+            total_bytes = sum(os.path.getsize(path) for path in paths)
+            print(f"Scale {scale}x ({total_bytes / 1024:.0f} KiB)...")
+
+            def parse():
+                return [doc_parser.parse_file(path) for path in paths]
+            parse_stats, texts = measure(parse, repeat)
+            parse_stats['mb_per_s'] = total_bytes / (1024 * 1024) / parse_stats['min_s']
+
+            corpus = Corpus((os.path.basename(path), text) for path, text in zip(paths, texts))
+            names = [os.path.basename(path) for path in paths]
+
+            def prompt():
+                return create_dynamic_prompt(corpus, detect_content_types(corpus, report=False), names)
+            prompt_stats, prompt_text = measure(prompt, repeat)
+
+            # Scale the LLM output with the input so section parsing and rendering grow too
+            llm.repeat_sections = scale
+            content = llm.generate(prompt_text)
+            section_stats, _ = measure(lambda: gen._parse_content_into_sections(content), repeat)
+
+            entry = {
+                'scale': scale,
+                'input_bytes': total_bytes,
+                'output_chars': len(content),
+                'parse': parse_stats,
+                'prompt': prompt_stats,
+                'sections': section_stats,
+            }
+
+            html_path = os.path.join(tmp, 'bench.html')
+            entry['render_html'], _ = measure(lambda: gen.generate_html(content, html_path), repeat)
+            if scale <= render_max_scale:
+                pdf_path = os.path.join(tmp, 'bench.pdf')
+                entry['render_pdf'], _ = measure(lambda: gen.generate_pdf_reportlab(content, pdf_path), repeat)
+            results.append(entry)
+
+    return {
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeat': repeat,
+        'results': results,
+    }
+
+def print_results(report, baseline=None):
+    """Print a table of min times, with % change against a baseline report if given."""
+    previous = {}
+    if baseline:
+        previous = {entry['scale']: entry for entry in baseline['results']}
+    stages = ['parse', 'prompt', 'sections', 'render_html', 'render_pdf']
+    print(f"\n{'Scale':>6} {'Stage':<12} {'Min s':>10} {'Median s':>10} {'Peak MiB':>9} {'Change':>8}")
+    for entry in report['results']:
+        for stage in stages:
+            if stage not in entry:
+                continue
+            stats = entry[stage]
+            change = ''
+            old = previous.get(entry['scale'], {}).get(stage)
+            if old and old['min_s'] > 0:
+                change = f"{(stats['min_s'] / old['min_s'] - 1) * 100:+.1f}%"
+            print(f"{entry['scale']:>6} {stage:<12} {stats['min_s']:>10.4f} {stats['median_s']:>10.4f} "
+                  f"{stats['peak_mem_mb']:>9.1f} {change:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parse -> prompt -> render pipeline")
+    parser.add_argument('--scales', default='1,10,100',
+                        help='Comma-separated corpus size multipliers (e.g. 1,10,100,1000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement')
+    parser.add_argument('--render-max-scale', type=int, default=100,
+                        help='Skip ReportLab rendering above this scale')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    parser.add_argument('--compare', help='Baseline JSON results to compare against')
+    args = parser.parse_args()
+
+    scales = [int(scale) for scale in args.scales.split(',')]
+    report = run_benchmarks(scales, args.repeat, args.render_max_scale)
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+    print_results(report, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import json
+import time
+from cache import hash_file, hash_text
+
+MANIFEST_VERSION = 1
+
+class BuildManifest:
+    """Records what a build consumed and produced so reruns can skip unchanged work.
+
+    Stored next to the output as <output>.build.json. It tracks input file
+    hashes, the text parsed from each input, LLM outputs per named unit (the
+    whole issue, or one section) keyed by a hash of that unit's inputs, and
+    the rendered artifact.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.data = {'version': MANIFEST_VERSION, 'files': {}, 'parsed': {}, 'units': {}, 'render': None}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as file:
+                    data = json.load(file)
+                if data.get('version') == MANIFEST_VERSION:
+                    self.data = data
+            except (OSError, ValueError):
+                print(f"Ignoring unreadable build manifest {path}")
+
+    @classmethod
+    def for_output(cls, output_path):
+        return cls(output_path + '.build.json')
+
+    def _file_hash(self, file_path):
+        """Hash a file, trusting the recorded hash when size and mtime are unchanged."""
+        stat = os.stat(file_path)
+        record = self.data['files'].get(os.path.abspath(file_path))
+        if record and record['size'] == stat.st_size and record['mtime'] == stat.st_mtime:
+            return record['hash']
+        return hash_file(file_path)
+
+    def record_files(self, file_paths):
+        for file_path in file_paths:
+            if os.path.exists(file_path):
+                stat = os.stat(file_path)
+                self.data['files'][os.path.abspath(file_path)] = {
+                    'hash': self._file_hash(file_path),
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime,
+                }
+
+    def parsed_text(self, file_path, settings):
+        """Return the text recorded for file_path if the file and parser settings are unchanged."""
+        record = self.data.setdefault('parsed', {}).get(os.path.abspath(file_path))
+        if record and record['settings'] == settings and record['hash'] == self._file_hash(file_path):
+            return record['text']
+        return None
+
+    def record_parsed(self, file_path, settings, text):
+        self.data.setdefault('parsed', {})[os.path.abspath(file_path)] = {
+            'hash': self._file_hash(file_path), 'settings': settings, 'text': text}
+
+    def lookup(self, unit, inputs):
+        """Return the recorded output for unit if its inputs are unchanged, else None."""
+        record = self.data['units'].get(unit)
+        if record and record['inputs'] == hash_text(inputs):
+            return record['output']
+        return None
+
+    def record(self, unit, inputs, output):
+        self.data['units'][unit] = {'inputs': hash_text(inputs), 'output': output,
+                                    'built': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+    def render_is_current(self, output_path, content, theme):
+        """True if output_path was rendered from this content and theme and is untouched."""
+        record = self.data.get('render')
+        return bool(record and os.path.exists(output_path)
+                    and record['content'] == hash_text(content, theme)
+                    and record['artifact'] == hash_file(output_path))
+
+    def record_render(self, output_path, content, theme):
+        self.data['render'] = {'content': hash_text(content, theme), 'artifact': hash_file(output_path)}
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.data, file, indent=2)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,109 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_CACHE_DIR = os.environ.get('MAGAZINE_CACHE_DIR', '.magazine_cache')
+
+def hash_file(file_path, block_size=1 << 20):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def hash_text(*parts):
+    """Return the SHA-256 hex digest of the given string parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+class SQLiteCache:
+    """Size-bounded LRU key/value store backed by a single SQLite file."""
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, ttl=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON entries(last_access)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss."""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                if row is not None:
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return row[0]
+
+    def set(self, key, value):
+        """Store value under key and evict least recently used entries if needed."""
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO entries (key, value, size, created, last_access) "
+                         "VALUES (?, ?, ?, ?, ?)", (key, value, size, now, now))
+            self._evict(conn)
+
+    def _evict(self, conn):
+        """Drop least recently used entries until the store fits max_bytes."""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        """Remove every entry from the store."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM entries")
+
+    def stats(self):
+        """Return hit/miss counters for this process."""
+        return {'hits': self.hits, 'misses': self.misses}
+
+class ParseCache(SQLiteCache):
+    """Cache of extracted document text keyed by file content hash."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=256 * 1024 * 1024):
+        super().__init__(os.path.join(cache_dir, 'parse.sqlite'), max_bytes=max_bytes)
+
+    def make_key(self, file_path, parser_version, settings):
+        """Build a cache key from file contents, parser version and settings."""
+        return hash_text(hash_file(file_path), parser_version, sorted(settings.items()))
+
+class ResponseCache(SQLiteCache):
+    """Cache of LLM completions keyed by backend, model, prompt and parameters."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=64 * 1024 * 1024, ttl=7 * 24 * 3600):
+        super().__init__(os.path.join(cache_dir, 'llm.sqlite'), max_bytes=max_bytes, ttl=ttl)
+
+    def make_key(self, backend, model, prompt, params):
+        """Build a cache key from the request fingerprint."""
+        return hash_text(backend, model, hash_text(prompt), sorted(params.items()))
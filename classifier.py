@@ -0,0 +1,131 @@
+import re
+import json
+from collections import Counter
+
+try:
+    import yaml
+except ImportError:  # YAML taxonomies are optional; JSON always works
+    yaml = None
+
+CONTENT_KEYWORDS = {
+    'sports': ['sports', 'tournament', 'championship', 'medal', 'athlete', 'competition'],
+    'academic': ['academic', 'achievement', 'scholarship', 'cgpa', 'research', 'publication'],
+    'cultural': ['cultural', 'festival', 'music', 'dance', 'drama', 'art', 'performance'],
+    'infrastructure': ['infrastructure', 'facility', 'laboratory', 'building', 'construction'],
+    'events': ['event', 'conference', 'seminar', 'workshop', 'celebration']
+}
+
+def load_taxonomy(path):
+    """Load a {category: [keywords]} taxonomy from a JSON or YAML file."""
+    with open(path, 'r', encoding='utf-8') as file:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ValueError("PyYAML is required for YAML taxonomies (pip install pyyaml)")
+            taxonomy = yaml.safe_load(file)
+        else:
+            taxonomy = json.load(file)
+    if not isinstance(taxonomy, dict) or not all(isinstance(words, list) for words in taxonomy.values()):
+        raise ValueError(f"Taxonomy {path} must map each category to a list of keywords")
+    for category, words in taxonomy.items():
+        if not all(isinstance(word, str) and word.strip() for word in words):
+            raise ValueError(f"Taxonomy {path}: every keyword of '{category}' must be a non-empty string")
+    return taxonomy
+
+def _trie_pattern(words):
+    """Build a regex alternation for words factored by common prefix.
+
+    'art', 'artist' and 'athlete' become a(?:rt(?:ist)?|thlete), so the
+    engine tries each leading character once instead of every keyword.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = None
+
+    def build(node):
+        if list(node) == ['']:
+            return ''
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{pattern})?' if '' in node else pattern
+
+    return build(trie)
+
+class ContentClassifier:
+    """Keyword classifier compiled once into a single word-boundary regex.
+
+    One pass over the lowercased text counts hits for every category, instead
+    of a substring scan per keyword. Keywords match whole words (plus a plural
+    s/es/ies), so 'art' no longer matches inside 'start'. Multi-word keywords
+    match a single space.
+    """
+
+    def __init__(self, taxonomy=None, min_hits=1):
+        self.taxonomy = taxonomy or CONTENT_KEYWORDS
+        self.min_hits = min_hits
+        self.categories = {}
+        for category, keywords in self.taxonomy.items():
+            for keyword in keywords:
+                keyword = ' '.join(keyword.lower().split())
+                if not keyword:  # would make the whole pattern optional and match everywhere
+                    continue
+                forms = [keyword]
+                if keyword.endswith('y') and len(keyword) >= 3:
+                    forms.append(keyword[:-1] + 'ies')
+                for form in forms:
+                    self.categories.setdefault(form, []).append(category)
+        # Matching the lowercased text is much faster than re.IGNORECASE
+        self.pattern = None
+        if self.categories:
+            # Lookarounds instead of \b, which never matches after a keyword like 'c++'
+            self.pattern = re.compile(rf'(?<!\w)({_trie_pattern(self.categories)})(?:e?s)?(?!\w)')
+
+    def count(self, text):
+        """Return a Counter of keyword hits per category."""
+        hits = Counter()
+        if self.pattern is None:
+            return hits
+        for keyword, count in Counter(self.pattern.findall(text.lower())).items():
+            for category in self.categories[keyword]:
+                hits[category] += count
+        return hits
+
+    def types(self, hits):
+        """Return categories with at least min_hits, in taxonomy order, or ['general']."""
+        detected = [category for category in self.taxonomy if hits[category] >= self.min_hits]
+        return detected or ['general']
+
+    def classify(self, text):
+        """Return the detected categories, stopping the scan once every category is found."""
+        hits = Counter()
+        if self.pattern is not None:
+            remaining = set(self.taxonomy)
+            for match in self.pattern.finditer(text.lower()):
+                for category in self.categories[match.group(1)]:
+                    hits[category] += 1
+                    if hits[category] >= self.min_hits:
+                        remaining.discard(category)
+                if not remaining:
+                    break
+        return self.types(hits)
+
+    def classify_segments(self, segments):
+        """Count hits per (source, text) segment; returns ({source: Counter}, total Counter)."""
+        per_file = {}
+        total = Counter()
+        for source, text in segments:
+            hits = self.count(text)
+            per_file[source] = per_file.get(source, Counter()) + hits
+            total.update(hits)
+        return per_file, total
+
+_default_classifier = None
+
+def default_classifier():
+    """Return a shared classifier for the built-in taxonomy, compiling it on first use."""
+    global _default_classifier
+    if _default_classifier is None:
+        _default_classifier = ContentClassifier()
+    return _default_classifier
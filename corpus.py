@@ -0,0 +1,72 @@
+import bisect
+from tokens import estimate_tokens
+
+class Segment:
+    """Text parsed from one input file and where it sits in the joined corpus."""
+
+    __slots__ = ('source', 'text', 'start', 'metadata')
+
+    def __init__(self, source, text, start, metadata):
+        self.source = source
+        self.text = text
+        self.start = start
+        self.metadata = metadata
+
+    @property
+    def end(self):
+        return self.start + len(self.text)
+
+class Corpus:
+    """Parsed input files kept as separate segments instead of one growing string.
+
+    Iterating yields (source, text) pairs, so a Corpus can be passed anywhere
+    a segment list is accepted (chunking, retrieval, classification). The
+    prompt text, with a '--- Content from <source> ---' header per file, is
+    produced lazily by iter_text() or joined once by text().
+    """
+
+    HEADER = "\n--- Content from {source} ---\n"
+
+    def __init__(self, segments=()):
+        self.segments = []
+        self.length = 0
+        self._starts = []
+        for source, text in segments:
+            self.add(source, text)
+
+    def add(self, source, text, **metadata):
+        """Append a file's text; metadata (path, elapsed, ...) is kept on the segment."""
+        start = self.length + len(self.HEADER.format(source=source))
+        self.segments.append(Segment(source, text, start, metadata))
+        self._starts.append(start)
+        self.length = start + len(text) + 1
+
+    def __iter__(self):
+        return ((segment.source, segment.text) for segment in self.segments)
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __bool__(self):
+        return bool(self.segments)
+
+    def iter_text(self):
+        """Yield the pieces of the joined corpus text without building it."""
+        for segment in self.segments:
+            yield self.HEADER.format(source=segment.source)
+            yield segment.text
+            yield "\n"
+
+    def text(self):
+        """Return the joined corpus text, built with a single join."""
+        return ''.join(self.iter_text())
+
+    def estimate_tokens(self):
+        return sum(estimate_tokens(segment.text) for segment in self.segments)
+
+    def segment_at(self, offset):
+        """Return the segment containing offset in the joined text, or None."""
+        index = bisect.bisect_right(self._starts, offset) - 1
+        if index >= 0 and offset < self.segments[index].end:
+            return self.segments[index]
+        return None
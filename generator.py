@@ -5,6 +5,7 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak,
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
 from weasyprint import HTML, CSS
+from profiling import profiled, span
 
 class MagazineGenerator:
     def __init__(self, theme='professional'):
@@ -613,9 +614,11 @@ class MagazineGenerator:
                     story.append(Paragraph(item, self.styles['NormalTight']))
 
         print(f"DEBUG: Total story elements: {len(story)}")
-        doc.build(story, onFirstPage=self._add_page_decorations,
-                 onLaterPages=self._add_page_decorations)
+        with span('doc.build', elements=len(story)):
+            doc.build(story, onFirstPage=self._add_page_decorations,
+                     onLaterPages=self._add_page_decorations)
 
+    @profiled('MagazineGenerator._parse_content_into_sections')
     def _parse_content_into_sections(self, content):
         """Parse the LLM-generated content into magazine sections."""
         sections = {}
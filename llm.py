@@ -1,50 +1,486 @@
+import json
+import time
+import random
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 import ollama
 from typing import cast, Dict, Any
+from cache import ResponseCache, DEFAULT_CACHE_DIR
+from profiling import profiler, span
+from tokens import count_tokens, context_limit, completion_budget, DEFAULT_MAX_TOKENS
+
+DEFAULT_OPENROUTER_MODEL = "microsoft/wizardlm-2-8x22b"
+DEFAULT_OLLAMA_MODEL = "tinyllama"
+
+# Appended to a prefix primed into an Ollama context; the real prompt follows as the next turn
+PRIME_SUFFIX = "\n\nThe material to work on follows in the next message. Reply only with OK."
+
+# HTTP statuses worth retrying; anything else non-200 is treated as fatal
+TRANSIENT_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+class LLMError(Exception):
+    """Raised when an LLM backend fails in a way retrying will not fix."""
+
+class TransientLLMError(LLMError):
+    """Raised when an LLM backend fails in a way that may succeed on retry."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class ContextLengthError(LLMError):
+    """Raised when a prompt leaves no room for a completion in the model's context window."""
+
+class LLMBackend:
+    """Interface for pluggable generation backends used by LLMHandler.
+
+    Subclasses set name and model and implement generate(). stream() should
+    yield (text, token_count) pairs, where token_count is None except when
+    the backend reports the final completion token count. An optional async
+    agenerate(prompt) is used by AsyncLLMHandler when present. close() and
+    an optional async aclose() are called when the handler releases its
+    connections. An optional context_tokens attribute replaces the known
+    context window of model.
+    """
+    name = 'custom'
+    model = 'default'
+
+    def generate(self, prompt):
+        raise NotImplementedError
+
+    def stream(self, prompt):
+        yield self.generate(prompt), None
+
+    def close(self):
+        pass
+
+def run_prompts(llm, prompts, max_workers=4):
+    """Run prompts concurrently on llm, returning responses in input order.
+
+    Uses llm.run_batch() when available (AsyncLLMHandler), otherwise a
+    thread pool of up to max_workers calling llm.generate().
+    """
+    run_batch = getattr(llm, 'run_batch', None)
+    if run_batch is not None and len(prompts) > 1:
+        return run_batch(prompts)
+    if len(prompts) <= 1 or max_workers <= 1:
+        return [llm.generate(prompt) for prompt in prompts]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(prompts))) as pool:
+        return list(pool.map(llm.generate, prompts))
 
 class LLMHandler:
-    def __init__(self, openrouter_api_key=None):
+    def __init__(self, openrouter_api_key=None, cache_dir=DEFAULT_CACHE_DIR, use_cache=True,
+                 cache_ttl=7 * 24 * 3600, cache_max_bytes=64 * 1024 * 1024, refresh_cache=False,
+                 pool_size=10, connect_timeout=10, read_timeout=120,
+                 max_retries=3, backoff_base=1.0, backoff_max=30.0, backend=None,
+                 max_tokens=DEFAULT_MAX_TOKENS, ollama_keep_alive=None, ollama_options=None,
+                 ollama_reuse_context=False, context_window=None):
+        # A custom LLMBackend replaces the built-in OpenRouter/Ollama selection
+        self.backend = backend
         self.openrouter_api_key = openrouter_api_key
         self.openrouter_url = "https://openrouter.ai/api/v1/chat/completions"
+        self.cache = ResponseCache(cache_dir, cache_max_bytes, cache_ttl) if use_cache else None
+        self.refresh_cache = refresh_cache
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_tokens = max_tokens
+        # Overrides the known context window of every model (Ollama's num_ctx still wins)
+        self.context_window = context_window
+        # Ollama: how long the model stays loaded, model options (num_ctx, num_thread,
+        # num_predict) and contexts of primed prompt prefixes keyed by (model, prefix)
+        self.ollama_keep_alive = ollama_keep_alive
+        self.ollama_options = dict(ollama_options or {})
+        self.ollama_reuse_context = ollama_reuse_context
+        self._ollama_contexts = {}
+        self._session = None
+        self.last_stream_stats = None
+        # Tokens of real backend calls; responses served from the cache are only counted
+        self.usage = {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cached_calls': 0}
+        self._usage_lock = threading.Lock()
 
-    def generate_with_openrouter(self, prompt, model="microsoft/wizardlm-2-8x22b"):
-        """Generate text using OpenRouter free API."""
+    @property
+    def session(self):
+        """Shared keep-alive session so repeated calls reuse TLS connections."""
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._session = session
+        return self._session
+
+    def close(self):
+        """Release pooled HTTP connections, including the custom backend's."""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+        if self.backend is not None:
+            self.backend.close()
+
+    def _backoff_delay(self, attempt, retry_after=None):
+        """Exponential backoff with full jitter, honoring a server Retry-After hint."""
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @staticmethod
+    def _parse_retry_after(response):
+        """Return the Retry-After header in seconds, if present and numeric."""
+        value = response.headers.get('Retry-After')
+        try:
+            return max(0.0, float(value)) if value is not None else None
+        except ValueError:
+            return None
+
+    def _post_openrouter(self, data, stream=False):
+        """POST to OpenRouter with retries on transient failures; returns the response."""
         headers = {
             "Authorization": f"Bearer {self.openrouter_api_key}",
             "Content-Type": "application/json"
         }
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(self.openrouter_url, headers=headers, json=data,
+                                             timeout=self.timeout, stream=stream)
+                self._check_openrouter_response(response)
+                return response
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = TransientLLMError(f"OpenRouter connection error: {e}")
+            except TransientLLMError as e:
+                error = e
+            time.sleep(self._retry_delay(error, attempt))
+            attempt += 1
+
+    def _check_openrouter_response(self, response):
+        """Raise TransientLLMError or LLMError unless an OpenRouter response has status 200."""
+        if response.status_code == 200:
+            return
+        if response.status_code in TRANSIENT_STATUS_CODES:
+            raise TransientLLMError(f"OpenRouter API error: {response.status_code}",
+                                    self._parse_retry_after(response))
+        raise LLMError(f"OpenRouter API error: {response.status_code}")
+
+    def _retry_delay(self, error, attempt):
+        """Return and log the wait before retrying after a transient error; re-raise it when out of retries."""
+        if attempt >= self.max_retries:
+            raise error
+        delay = self._backoff_delay(attempt, error.retry_after)
+        print(f"{error}; retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+        return delay
+
+    def context_tokens(self):
+        """Context window of the model generate() tries first, or None if unknown."""
+        if self.backend is not None:
+            return (self.context_window or getattr(self.backend, 'context_tokens', None)
+                    or context_limit(self.backend.model))
+        if self.openrouter_api_key:
+            return self.context_window or context_limit(DEFAULT_OPENROUTER_MODEL)
+        return self.ollama_options.get('num_ctx') or self.context_window or context_limit(DEFAULT_OLLAMA_MODEL)
+
+    def _max_tokens(self, model, prompt, limit=None):
+        """Size the completion to what model's context window leaves after the prompt.
+
+        limit (Ollama's num_ctx), then context_window, overrides the model's
+        known window. Raises ContextLengthError rather than letting the
+        backend silently truncate the prompt or the answer.
+        """
+        prompt_tokens = count_tokens(prompt)
+        limit = limit or self.context_window or context_limit(model)
+        max_tokens = completion_budget(prompt_tokens, limit, self.max_tokens)
+        if max_tokens is None:
+            raise ContextLengthError(f"Prompt is {prompt_tokens} tokens but {model} has a {limit} token "
+                                     f"context; use --context-tokens or --prompt-budget")
+        return max_tokens
+
+    def _record_usage(self, prompt_tokens, completion_tokens):
+        with self._usage_lock:
+            self.usage['calls'] += 1
+            self.usage['prompt_tokens'] += prompt_tokens
+            self.usage['completion_tokens'] += completion_tokens
+
+    def _record_cache_hit(self):
+        with self._usage_lock:
+            self.usage['cached_calls'] += 1
+
+    def usage_stats(self):
+        """Return cumulative backend calls, their prompt/completion tokens and cache hits."""
+        with self._usage_lock:
+            return dict(self.usage)
+
+    def _cached_call(self, backend, model, prompt, params, call):
+        """Return a cached response for this request or run call(), record its usage and store it."""
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(backend, model, prompt, params)
+            if not self.refresh_cache:
+                response = self.cache.get(key)
+                if response is not None:
+                    self._record_cache_hit()
+                    return response
+        response = call()
+        self._record_usage(count_tokens(prompt), count_tokens(response))
+        if key is not None:
+            self.cache.set(key, response)
+        return response
+
+    def generate_with_openrouter(self, prompt, model=DEFAULT_OPENROUTER_MODEL):
+        """Generate text using OpenRouter free API."""
         data = {
             "model": model,
             "messages": [{"role": "user", "content": prompt}],
-            "max_tokens": 1000
+            "max_tokens": self._max_tokens(model, prompt)
         }
-        response = requests.post(self.openrouter_url, headers=headers, json=data)
-        if response.status_code == 200:
+
+        def call():
+            response = self._post_openrouter(data)
             return response.json()['choices'][0]['message']['content']
-        else:
-            raise Exception(f"OpenRouter API error: {response.status_code}")
 
-    def generate_with_ollama(self, prompt, model="tinyllama"):
-        """Generate text using Ollama locally."""
+        return self._cached_call('openrouter', model, prompt, {'max_tokens': data['max_tokens']}, call)
+
+    def _ollama_request(self, model, prompt):
+        """Build ollama.generate() arguments: options, keep_alive and any primed context.
+
+        Ollama would silently drop the start of an overlong prompt, so the
+        window is checked here and num_predict defaults to the room left.
+        context_window is sent as num_ctx unless that option is set.
+        """
+        options = dict(self.ollama_options)
+        if self.context_window:
+            options.setdefault('num_ctx', self.context_window)
+        options.setdefault('num_predict', self._max_tokens(model, prompt, options.get('num_ctx')))
+        request = {'model': model, 'prompt': prompt, 'options': options}
+        if self.ollama_keep_alive is not None:
+            request['keep_alive'] = self.ollama_keep_alive
+        primed = [prefix for (primed_model, prefix) in self._ollama_contexts
+                  if primed_model == model and prompt.startswith(prefix)]
+        if primed:
+            prefix = max(primed, key=len)
+            request['prompt'] = prompt[len(prefix):]
+            request['context'] = self._ollama_contexts[(model, prefix)]
+        return request
+
+    @staticmethod
+    def _ollama_params(request):
+        """Request settings that change the output, for the response cache key."""
+        options = {name: value for name, value in request['options'].items() if name != 'num_thread'}
+        return {'options': options, 'primed': 'context' in request}
+
+    def preload_ollama(self, model=DEFAULT_OLLAMA_MODEL, prefixes=()):
+        """Load model into Ollama now instead of on the first prompt; returns False if unreachable.
+
+        With ollama_reuse_context, each of prefixes is then sent once and the
+        returned context kept. Later prompts that start with a primed prefix
+        send only the remainder with that context, so Ollama does not
+        re-process the shared instructions.
+        """
+        keep_alive = {'keep_alive': self.ollama_keep_alive} if self.ollama_keep_alive is not None else {}
+        start = time.perf_counter()
         try:
-            response = ollama.generate(model=model, prompt=prompt)
-            response_dict = cast(Dict[str, Any], response)
-            return response_dict['response']
+            ollama.generate(model=model, prompt='', **keep_alive)  # an empty prompt only loads the model
         except Exception as e:
-            raise Exception(f"Ollama error: {e}")
+            print(f"Could not preload Ollama model {model}: {e}")
+            return False
+        print(f"Ollama model {model} loaded in {time.perf_counter() - start:.1f}s")
+        if self.ollama_reuse_context:
+            options = {**self.ollama_options, 'num_predict': 8}
+            for prefix in prefixes:
+                try:
+                    response = ollama.generate(model=model, prompt=prefix + PRIME_SUFFIX, options=options,
+                                               **keep_alive)
+                    self._ollama_contexts[(model, prefix)] = cast(Dict[str, Any], response)['context']
+                except Exception as e:
+                    print(f"Could not prime Ollama context: {e}")
+            print(f"Primed {len(self._ollama_contexts)} shared prompt prefixes in "
+                  f"{time.perf_counter() - start:.1f}s")
+        return True
 
-    def generate(self, prompt):
-        """Generate text with fallback and post-processing."""
+    def generate_with_ollama(self, prompt, model=DEFAULT_OLLAMA_MODEL):
+        """Generate text using Ollama locally."""
+        request = self._ollama_request(model, prompt)
+
+        def call():
+            try:
+                response = ollama.generate(**request)
+                response_dict = cast(Dict[str, Any], response)
+                return response_dict['response']
+            except Exception as e:
+                raise Exception(f"Ollama error: {e}")
+
+        return self._cached_call('ollama', model, prompt, self._ollama_params(request), call)
+
+    def generate_with_backend(self, prompt):
+        """Generate text using the configured custom backend."""
+        backend = self.backend
+        self._max_tokens(backend.model, prompt)
+        return self._cached_call(backend.name, backend.model, prompt, {},
+                                 lambda: backend.generate(prompt))
+
+    def _cached_stream(self, backend, model, prompt, params, open_stream):
+        """Yield chunks from open_stream(), recording latency stats and caching the result.
+
+        open_stream() must yield (text, token_count) pairs where token_count is
+        None except when the backend reports the final completion token count.
+        """
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(backend, model, prompt, params)
+            if not self.refresh_cache:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    self.last_stream_stats = {'backend': backend, 'model': model, 'cached': True,
+                                              'ttft': 0.0, 'elapsed': 0.0, 'tokens': None,
+                                              'tokens_per_sec': None}
+                    self._record_cache_hit()
+                    yield cached
+                    return
+
+        start = time.perf_counter()
+        first_token_at = None
+        parts = []
+        chunk_count = 0
+        tokens = None
+        for text, token_count in open_stream():
+            if token_count is not None:
+                tokens = token_count
+            if not text:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            parts.append(text)
+            chunk_count += 1
+            yield text
+        elapsed = time.perf_counter() - start
+
+        # Without a usage report each streamed delta is roughly one token
+        tokens = tokens if tokens is not None else chunk_count
+        ttft = (first_token_at - start) if first_token_at is not None else elapsed
+        generation_time = elapsed - ttft
+        self.last_stream_stats = {
+            'backend': backend,
+            'model': model,
+            'cached': False,
+            'ttft': ttft,
+            'elapsed': elapsed,
+            'tokens': tokens,
+            'tokens_per_sec': tokens / generation_time if generation_time > 0 else None,
+        }
+        self._record_usage(count_tokens(prompt), tokens)
+        if key is not None:
+            self.cache.set(key, ''.join(parts))
+
+    def stream_with_openrouter(self, prompt, model=DEFAULT_OPENROUTER_MODEL):
+        """Stream text chunks from OpenRouter using server-sent events."""
+        data = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": self._max_tokens(model, prompt),
+            "stream": True
+        }
+
+        def open_stream():
+            response = self._post_openrouter(data, stream=True)
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith('data: '):
+                        continue  # blank keep-alives and ': OPENROUTER PROCESSING' comments
+                    payload = line[len('data: '):]
+                    if payload == '[DONE]':
+                        break
+                    event = json.loads(payload)
+                    usage = event.get('usage') or {}
+                    choices = event.get('choices') or [{}]
+                    text = (choices[0].get('delta') or {}).get('content') or ''
+                    yield text, usage.get('completion_tokens')
+            finally:
+                response.close()
+
+        return self._cached_stream('openrouter', model, prompt, {'max_tokens': data['max_tokens']}, open_stream)
+
+    def stream_with_ollama(self, prompt, model=DEFAULT_OLLAMA_MODEL):
+        """Stream text chunks from a local Ollama model."""
+        request = self._ollama_request(model, prompt)
+
+        def open_stream():
+            try:
+                for part in ollama.generate(stream=True, **request):
+                    part = cast(Dict[str, Any], part)
+                    yield part.get('response', ''), part.get('eval_count') if part.get('done') else None
+            except Exception as e:
+                raise Exception(f"Ollama error: {e}")
+
+        return self._cached_stream('ollama', model, prompt, self._ollama_params(request), open_stream)
+
+    def stream(self, prompt):
+        """Yield generated text chunks as they arrive, with the same fallback as generate().
+
+        Falls back to Ollama only if OpenRouter fails before producing any output.
+        Timing for the finished stream is available in last_stream_stats.
+        """
+        with span('LLMHandler.stream') as stats:
+            parts = [] if profiler.enabled else None
+            for chunk in self._stream(prompt):
+                if parts is not None:
+                    parts.append(chunk)
+                yield chunk
+            if parts is not None:
+                self.describe_call(stats, self.last_stream_stats['backend'], prompt, ''.join(parts))
+
+    def _stream(self, prompt):
+        if self.backend is not None:
+            backend = self.backend
+            yield from self._cached_stream(backend.name, backend.model, prompt, {},
+                                           lambda: backend.stream(prompt))
+            return
         if self.openrouter_api_key:
+            started = False
             try:
-                response = self.generate_with_openrouter(prompt)
-            except:
-                print("OpenRouter failed, falling back to Ollama.")
+                for chunk in self.stream_with_openrouter(prompt):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started:
+                    raise
+                print(f"OpenRouter failed ({e}), falling back to Ollama.")
+        yield from self.stream_with_ollama(prompt)
+
+    def generate(self, prompt):
+        """Generate text with fallback and post-processing."""
+        with span('LLMHandler.generate') as stats:
+            if self.backend is not None:
+                response = self.generate_with_backend(prompt)
+                backend = self.backend.name
+            elif self.openrouter_api_key:
+                try:
+                    response = self.generate_with_openrouter(prompt)
+                    backend = 'openrouter'
+                except Exception as e:
+                    print(f"OpenRouter failed ({e}), falling back to Ollama.")
+                    response = self.generate_with_ollama(prompt)
+                    backend = 'ollama'
+            else:
                 response = self.generate_with_ollama(prompt)
-        else:
-            response = self.generate_with_ollama(prompt)
+                backend = 'ollama'
+            self.describe_call(stats, backend, prompt, response)
         return response
 
+    @staticmethod
+    def describe_call(stats, backend, prompt, response):
+        """Add the backend and prompt/response sizes to a span's fields; counts nothing unless profiling."""
+        if profiler.enabled:
+            stats.update(backend=backend, prompt_chars=len(prompt), prompt_tokens=count_tokens(prompt),
+                         response_chars=len(response), response_tokens=count_tokens(response))
+
+    def cache_stats(self):
+        """Return response cache hit/miss counters, or None when caching is off."""
+        return self.cache.stats() if self.cache is not None else None
+
 # Example usage
 if __name__ == "__main__":
     llm = LLMHandler()
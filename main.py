@@ -1,167 +1,502 @@
 import os
+import time
 import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from parser import DocumentParser
-from llm import LLMHandler
+from async_llm import AsyncLLMHandler
+from mock_backend import MockBackend, LatencyModel
+from router import BackendRouter, OpenRouterBackend, OllamaBackend
 from generator import MagazineGenerator
-
-def analyze_content_type(text):
+from cache import DEFAULT_CACHE_DIR
+from summarizer import MapReduceSummarizer
+from classifier import ContentClassifier, default_classifier, load_taxonomy
+from sections import SectionedGenerator, plan_sections, section_query, DEFAULT_EXCERPT_TOKENS
+from prompts import get_templates
+from retrieval import BM25Index
+from corpus import Corpus
+from build import BuildManifest
+from tokens import count_tokens, MIN_COMPLETION_TOKENS, DEFAULT_MAX_TOKENS
+from profiling import profiler, profiled
+from preprocess import PRESETS
+
+@profiled('analyze_content_type')
+def analyze_content_type(text, classifier=None):
     """Analyze the type of content in the input text."""
-    text_lower = text.lower()
-
-    content_types = {
-        'sports': ['sports', 'tournament', 'championship', 'medal', 'athlete', 'competition'],
-        'academic': ['academic', 'achievement', 'scholarship', 'cgpa', 'research', 'publication'],
-        'cultural': ['cultural', 'festival', 'music', 'dance', 'drama', 'art', 'performance'],
-        'infrastructure': ['infrastructure', 'facility', 'laboratory', 'building', 'construction'],
-        'events': ['event', 'conference', 'seminar', 'workshop', 'celebration']
-    }
-
-    detected_types = []
-    for content_type, keywords in content_types.items():
-        if any(keyword in text_lower for keyword in keywords):
-            detected_types.append(content_type)
-
-    return detected_types if detected_types else ['general']
-
-def create_dynamic_prompt(content, content_types, file_names):
-    """Create a dynamic prompt based on content analysis."""
-    base_prompt = f"""Please analyze the following content from files: {', '.join(file_names)}
-
-CONTENT TO ANALYZE:
-{content}
-
-DETECTED CONTENT TYPES: {', '.join(content_types)}
-
-CRITICAL INSTRUCTIONS:
-1. Create an appropriate magazine title based on the content
-2. Extract and organize ONLY the information provided in the input - do not add external information
-3. Structure the content into logical sections based on the detected content types
-4. Use bullet points for lists and achievements
-5. Keep the language engaging and professional
-6. Fix any typos in the original content (e.g., 'Winers' → 'Winners', 'gamings' → 'gaming')
-7. Maintain accuracy - if something isn't mentioned, don't add it
-8. Focus on the actual events, achievements, and details from the provided content
-
-REQUIRED SECTIONS:"""
-
-    # Add specific sections based on content type
-    if 'sports' in content_types:
-        base_prompt += """
-- Event Overview (date, location, participants, theme)
-- Competition Results (actual results from the content)
-- Achievements & Winners (medals, championships, records)
-- Event Highlights (key moments, special features)
-- Participant Feedback (testimonials from students/faculty)
-- Future Plans (mentioned future developments)"""
-
-    if 'academic' in content_types:
-        base_prompt += """
-- Academic Excellence (top performers, CGPA, awards)
-- Student Achievements (projects, research, publications)
-- Department Highlights (placement rates, patents, facilities)
-- Scholarships & Awards (financial support, merit scholarships)
-- Faculty Achievements (research papers, awards)
-- Upcoming Events (mentioned future activities)"""
-
-    if 'cultural' in content_types:
-        base_prompt += """
-- Event Overview
-- Competition Results
-- Performances & Highlights
-- Organizing Team
-- Participant Feedback
-- Future Events"""
-
-    if 'infrastructure' in content_types:
-        base_prompt += """
-- New Facilities
-- Infrastructure Updates
-- Technology Enhancements
-- Future Developments
-- Impact on Students"""
-
-    base_prompt += """
-
-FORMATTING RULES:
-- Use proper capitalization and punctuation
-- Correct spelling errors from the original content
-- Organize information chronologically or by importance
-- Use clear section headers
-- Keep the content concise but comprehensive
-- End with a positive conclusion based on the actual content
-
-OUTPUT FORMAT: Create a well-structured magazine article that accurately reflects ONLY the provided content. Use this exact format:
-
-TITLE: [Magazine Title]
-
-[SECTION HEADER 1]
-[Content for section 1]
-
-[SECTION HEADER 2]
-[Content for section 2]
-
-[CONCLUSION]
-[Final thoughts]"""
-
-    return base_prompt
-
-    return base_prompt
+    return (classifier or default_classifier()).classify(text)
+
+@profiled('detect_content_types')
+def detect_content_types(corpus, classifier=None, report=True):
+    """Classify each parsed file, report its keyword hits and return the corpus content types."""
+    classifier = classifier or default_classifier()
+    per_file, total = classifier.classify_segments(corpus)
+    for source, hits in per_file.items() if report else ():
+        summary = ', '.join(f"{category}={count}" for category, count in hits.most_common()) or 'no keywords'
+        print(f"  {source}: {summary}")
+    return classifier.types(total)
+
+@profiled('create_dynamic_prompt')
+def create_dynamic_prompt(content, content_types, file_names, theme=None):
+    """Create a dynamic prompt based on content analysis.
+
+    The text comes from the templates in prompts/. content may be a string or
+    a Corpus; a Corpus is streamed into the prompt so its text is copied once.
+    """
+    pieces = content.iter_text() if isinstance(content, Corpus) else [content]
+    return get_templates().issue_prompt(pieces, content_types, file_names, theme)
+
+# Parsers kept alive inside each worker process so OCR engines and caches are reused
+_worker_parsers = {}
+
+def _parse_file_worker(file_path, parser_options):
+    """Parse a single file in a worker process and time it."""
+    start = time.perf_counter()
+    key = tuple(sorted(parser_options.items()))
+    doc_parser = _worker_parsers.get(key)
+    if doc_parser is None:
+        doc_parser = _worker_parsers[key] = DocumentParser(**parser_options)
+    text = doc_parser.parse_file(file_path)
+    return text, time.perf_counter() - start
+
+def parse_files(file_paths, doc_parser, jobs=1, pool=None, manifest=None):
+    """Parse input files, optionally across a process pool.
+
+    Pass an existing ProcessPoolExecutor as pool to reuse warm workers across
+    calls. With a BuildManifest, files unchanged since the last build reuse
+    the text recorded there and only the others are parsed. Returns a list of
+    (file_path, text, error, elapsed) tuples in the same order as file_paths.
+    Failures are recorded instead of aborting the batch.
+    """
+    results = [None] * len(file_paths)
+    pending = []
+    settings = doc_parser.settings_key() if manifest else None
+    for index, file_path in enumerate(file_paths):
+        if not os.path.exists(file_path):
+            results[index] = (file_path, None, "File not found", 0.0)
+            continue
+        text = manifest.parsed_text(file_path, settings) if manifest else None
+        if text is not None:
+            results[index] = (file_path, text, None, 0.0)
+        else:
+            pending.append(index)
+    if manifest:
+        print(f"Incremental build: {len(pending)} of {len(file_paths)} inputs new or changed")
+
+    if pool is not None or (jobs > 1 and len(pending) > 1):
+        owned = pool is None
+        if owned:
+            pool = ProcessPoolExecutor(max_workers=min(jobs, len(pending)))
+        try:
+            futures = {index: pool.submit(_parse_file_worker, file_paths[index], doc_parser.options)
+                       for index in pending}
+            for index, future in futures.items():
+                try:
+                    text, elapsed = future.result()
+                    results[index] = (file_paths[index], text, None, elapsed)
+                    # Spans inside worker processes are not visible here, so record the file time
+                    profiler.record('parse_file (worker)', elapsed, file=os.path.basename(file_paths[index]))
+                except Exception as e:
+                    results[index] = (file_paths[index], None, str(e), 0.0)
+        finally:
+            if owned:
+                pool.shutdown()
+    else:
+        for index in pending:
+            start = time.perf_counter()
+            try:
+                text = doc_parser.parse_file(file_paths[index])
+                results[index] = (file_paths[index], text, None, time.perf_counter() - start)
+            except Exception as e:
+                results[index] = (file_paths[index], None, str(e), time.perf_counter() - start)
+
+    if manifest:
+        for index in pending:
+            file_path, text, error, _ = results[index]
+            if error is None:
+                manifest.record_parsed(file_path, settings, text)
+    return results
+
+def add_runtime_arguments(parser):
+    """Add parsing, caching and LLM options shared by main.py and batch.py."""
+    parser.add_argument('--api-key', help='OpenRouter API key')
+    parser.add_argument('--jobs', type=int, default=1,
+                       help='Number of worker processes for parsing (PDF/DOCX/OCR)')
+    parser.add_argument('--pdf-workers', type=int, default=1,
+                       help='Worker processes for extracting pages of large PDFs')
+    parser.add_argument('--no-pdf-ocr', action='store_true',
+                       help='Do not OCR PDF pages that have no text layer')
+    parser.add_argument('--ocr-dpi', type=int, default=200,
+                       help='Rasterization DPI for OCR of scanned PDF pages (lower is faster)')
+    parser.add_argument('--ocr-workers', type=int, default=1,
+                       help='Worker processes for OCR of scanned PDF pages')
+    parser.add_argument('--ocr-preset', default='balanced', choices=list(PRESETS),
+                       help='Image preprocessing before OCR: none, fast, balanced or accurate')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                       help='Directory for on-disk caches')
+    parser.add_argument('--no-parse-cache', action='store_true',
+                       help='Always re-extract text instead of using the parse cache')
+    parser.add_argument('--no-llm-cache', action='store_true',
+                       help='Disable the persistent LLM response cache')
+    parser.add_argument('--refresh-llm-cache', action='store_true',
+                       help='Ignore cached LLM responses and store fresh ones')
+    parser.add_argument('--llm-cache-ttl', type=float, default=7 * 24 * 3600,
+                       help='Seconds before a cached LLM response expires')
+    parser.add_argument('--llm-timeout', type=float, default=120,
+                       help='Read timeout in seconds for OpenRouter requests')
+    parser.add_argument('--llm-retries', type=int, default=3,
+                       help='Retries for transient OpenRouter errors (429/5xx/timeouts)')
+    parser.add_argument('--context-tokens', type=int,
+                       help='Model context window, also used to size completions (default: the known '
+                            'window of the model); larger inputs are summarized in chunks first')
+    parser.add_argument('--max-tokens', type=int, default=DEFAULT_MAX_TOKENS,
+                       help='Maximum completion tokens, reduced when the prompt leaves less room')
+    parser.add_argument('--chunk-workers', type=int, default=4,
+                       help='Maximum concurrent LLM calls (chunk summaries)')
+    parser.add_argument('--taxonomy',
+                       help='JSON or YAML file mapping content types to keywords (replaces the built-in one)')
+    parser.add_argument('--prompt-budget', type=int,
+                       help='Token budget for source text in the prompt; larger inputs keep only '
+                            'the most relevant passages')
+    parser.add_argument('--ollama-keep-alive', default='30m',
+                       help="How long Ollama keeps the model loaded after a request (e.g. 30m, 0, -1 for always)")
+    parser.add_argument('--ollama-num-ctx', type=int, help='Ollama context window (num_ctx)')
+    parser.add_argument('--ollama-num-thread', type=int, help='Ollama CPU threads (num_thread)')
+    parser.add_argument('--ollama-num-predict', type=int,
+                       help='Ollama maximum completion tokens (default: room left in the window)')
+    parser.add_argument('--no-ollama-preload', action='store_true',
+                       help='Do not load the Ollama model before the first prompt')
+    parser.add_argument('--ollama-reuse-context', action='store_true',
+                       help='Send the shared prompt instructions to Ollama once and reuse its context')
+    parser.add_argument('--style-prompt', action='store_true',
+                       help="Ask the LLM to write in the theme's style; LLM output is then not "
+                            "reused across themes")
+    parser.add_argument('--per-section', action='store_true',
+                       help='Generate each section with its own concurrent LLM call')
+    parser.add_argument('--backend', default='auto', choices=['auto', 'mock'],
+                       help='LLM backend: auto (OpenRouter, then Ollama) or mock (offline stand-in)')
+    parser.add_argument('--route', action='append', metavar='BACKEND[:MODEL]',
+                       help='Route prompts across backends (openrouter, ollama, mock), each optionally with '
+                            'a model; repeat for several. The fastest healthy route answers each prompt')
+    parser.add_argument('--hedge', action='store_true',
+                       help='With --route, also send a prompt to the next route if the first has not '
+                            'answered by its p95 latency, and use whichever answers first')
+    parser.add_argument('--circuit-cooldown', type=float, default=30.0,
+                       help='With --route, seconds a failing route is skipped before it is tried again')
+    parser.add_argument('--mock-ttft', type=float, default=0.0,
+                       help='Mock backend: median seconds to first token')
+    parser.add_argument('--mock-tokens-per-sec', type=float,
+                       help='Mock backend: generation speed (default: instant)')
+    parser.add_argument('--mock-distribution', default='fixed',
+                       choices=['fixed', 'uniform', 'normal', 'lognormal'],
+                       help='Mock backend: latency distribution')
+    parser.add_argument('--mock-jitter', type=float, default=0.0,
+                       help='Mock backend: latency spread as a fraction of --mock-ttft')
+    parser.add_argument('--mock-replay', help='Mock backend: JSON file of recorded responses')
+    parser.add_argument('--incremental', action='store_true',
+                       help='Track inputs and outputs in <output>.build.json and skip unchanged stages, '
+                            'including parsing unchanged files')
+    parser.add_argument('--profile', action='store_true',
+                       help='Print per-stage wall/CPU time, peak RSS and prompt sizes')
+    parser.add_argument('--profile-json', help='Write the profile report as JSON to this path')
+    parser.add_argument('--cprofile', help='Write a cProfile dump (pstats format) to this path')
+
+def start_profiling(args):
+    """Enable instrumentation when any profiling option was given."""
+    if args.profile or args.profile_json or args.cprofile:
+        profiler.start(args.cprofile)
+
+def finish_profiling(args):
+    """Stop instrumentation and emit the requested reports."""
+    if not profiler.enabled:
+        return
+    profiler.stop()
+    if args.profile:
+        profiler.report()
+    if args.profile_json:
+        profiler.write_json(args.profile_json)
+
+def create_document_parser(args):
+    """Build a DocumentParser from parsed command line options."""
+    return DocumentParser(cache_dir=args.cache_dir, use_cache=not args.no_parse_cache,
+                          pdf_workers=args.pdf_workers, pdf_ocr=not args.no_pdf_ocr,
+                          ocr_dpi=args.ocr_dpi, ocr_workers=args.ocr_workers,
+                          ocr_preset=args.ocr_preset)
+
+def create_classifier(args):
+    """Build a ContentClassifier from --taxonomy, or None for the built-in taxonomy."""
+    return ContentClassifier(load_taxonomy(args.taxonomy)) if args.taxonomy else None
+
+def parse_keep_alive(value):
+    """Ollama takes keep_alive as seconds or a duration string such as '30m'."""
+    return int(value) if value.lstrip('-').isdigit() else value
+
+def create_llm(args):
+    """Build an AsyncLLMHandler from parsed command line options."""
+    ollama_options = {name: value for name, value in [('num_ctx', args.ollama_num_ctx),
+                                                      ('num_thread', args.ollama_num_thread),
+                                                      ('num_predict', args.ollama_num_predict)]
+                      if value is not None}
+    backend = None
+    if args.route:
+        backend = create_router(args, ollama_options)
+    elif args.backend == 'mock':
+        backend = create_mock(args)
+    return AsyncLLMHandler(args.api_key, max_concurrency=args.chunk_workers,
+                           cache_dir=args.cache_dir, use_cache=not args.no_llm_cache,
+                           cache_ttl=args.llm_cache_ttl, refresh_cache=args.refresh_llm_cache,
+                           read_timeout=args.llm_timeout, max_retries=args.llm_retries,
+                           backend=backend, max_tokens=args.max_tokens,
+                           ollama_keep_alive=parse_keep_alive(args.ollama_keep_alive),
+                           ollama_options=ollama_options, ollama_reuse_context=args.ollama_reuse_context,
+                           context_window=args.context_tokens)
+
+def create_mock(args, model='mock-1', seed=0):
+    latency = LatencyModel(args.mock_ttft, args.mock_tokens_per_sec,
+                           args.mock_distribution, args.mock_jitter)
+    return MockBackend(latency, recordings=args.mock_replay, seed=seed, model=model)
+
+def create_router(args, ollama_options):
+    """Build a BackendRouter from --route specs such as 'openrouter', 'ollama:llama3' or 'mock'.
+
+    The routes share one uncached handler; the handler wrapping the router
+    does the caching, so a response is stored once rather than per route.
+    """
+    handler = AsyncLLMHandler(args.api_key, max_concurrency=args.chunk_workers * 2, use_cache=False,
+                              read_timeout=args.llm_timeout, max_retries=args.llm_retries,
+                              max_tokens=args.max_tokens, context_window=args.context_tokens,
+                              ollama_keep_alive=parse_keep_alive(args.ollama_keep_alive),
+                              ollama_options=ollama_options)
+    backends = []
+    for index, spec in enumerate(args.route):
+        name, _, model = spec.partition(':')
+        if name == 'openrouter':
+            if not args.api_key:
+                raise ValueError("--route openrouter needs an OpenRouter API key (--api-key)")
+            backends.append(OpenRouterBackend(handler, *([model] if model else [])))
+        elif name == 'ollama':
+            backends.append(OllamaBackend(handler, *([model] if model else [])))
+        elif name == 'mock':
+            backends.append(create_mock(args, model or f"mock-{index + 1}", seed=index))
+        else:
+            raise ValueError(f"Unknown route backend '{name}' (expected openrouter, ollama or mock)")
+    return BackendRouter(backends, hedge=args.hedge, cooldown=args.circuit_cooldown)
+
+def warm_up(llm, args):
+    """Start preloading the Ollama model in the background when Ollama is the primary backend.
+
+    Loading (and priming shared prompt prefixes) overlaps with parsing.
+    Returns the thread to join before the first prompt, or None.
+    """
+    if args.backend != 'auto' or args.api_key or args.route or args.no_ollama_preload:
+        return None
+    thread = threading.Thread(target=llm.preload_ollama,
+                              kwargs={'prefixes': get_templates().shared_prefixes()}, daemon=True)
+    thread.start()
+    return thread
+
+def assemble_corpus(results):
+    """Report parse results and collect the parsed files into a Corpus."""
+    corpus = Corpus()
+    for file_path, text, error, elapsed in results:
+        if error == "File not found":
+            print(f"File not found: {file_path}")
+        elif error:
+            print(f"Error parsing {file_path}: {error} ({elapsed:.2f}s)")
+        else:
+            corpus.add(os.path.basename(file_path), text, path=file_path, elapsed=elapsed)
+            print(f"Parsed: {file_path} ({len(text)} chars, {elapsed:.2f}s)")
+    return corpus
+
+def select_relevant(corpus, content_types, budget_tokens, taxonomy=None):
+    """Return a Corpus of the passages most relevant to the planned sections, within budget_tokens."""
+    index = BM25Index.from_segments(corpus)
+    owners = get_templates().section_types(content_types)
+    queries = [section_query(name, hint, owners.get(name), taxonomy)
+               for name, hint in plan_sections(content_types)]
+    selected = index.select_many(queries, budget_tokens)
+    print(f"Selected {len(selected)} of {len(index.passages)} passages "
+          f"(~{sum(index.tokens[i] for i in selected)} of {index.total_tokens} tokens)")
+    return Corpus(index.segments(selected))
+
+def build_prompt(llm, corpus, file_names, context_tokens=None, chunk_workers=4,
+                 prompt_budget=None, classifier=None, theme=None):
+    """Analyze the corpus and build the final prompt.
+
+    With prompt_budget, only the passages most relevant to the detected
+    content types are kept when the corpus is larger than the budget. If the
+    prompt plus a minimal completion still exceeds context_tokens (by default
+    the model's known window) it is summarized in chunks.
+    """
+    # Analyze content types
+    content_types = detect_content_types(corpus, classifier)
+    print(f"Detected content types: {', '.join(content_types)}")
+
+    if prompt_budget and corpus.estimate_tokens() > prompt_budget:
+        corpus = select_relevant(corpus, content_types, prompt_budget,
+                                 classifier.taxonomy if classifier else None)
+
+    # Create dynamic prompt based on content analysis
+    prompt = create_dynamic_prompt(corpus, content_types, file_names, theme)
+    context_tokens = context_tokens or llm.context_tokens()
+    prompt_tokens = count_tokens(prompt)
+    print(f"Prompt is {prompt_tokens} tokens")
+    if context_tokens and prompt_tokens > context_tokens - MIN_COMPLETION_TOKENS:
+        print(f"Prompt does not fit the {context_tokens} token context with room for the answer; "
+              f"summarizing in chunks...")
+        summarizer = MapReduceSummarizer(llm, context_tokens - MIN_COMPLETION_TOKENS, chunk_workers)
+        prompt = summarizer.prepare_prompt(
+            corpus, lambda notes: create_dynamic_prompt(notes, content_types, file_names, theme))
+    return prompt
+
+def prompt_theme(args):
+    """Theme to put in LLM prompts: only with --style-prompt, so by default
+    switching themes reuses the cached LLM output."""
+    return args.theme if args.style_prompt else None
+
+def generate_issue(llm, corpus, file_names, args, manifest=None, classifier=None):
+    """Generate the issue from a single prompt; returns (content, streamed)."""
+    prompt = build_prompt(llm, corpus, file_names, args.context_tokens, args.chunk_workers,
+                          args.prompt_budget, classifier, prompt_theme(args))
+    print("Generated prompt, calling LLM...")
+    organized_content = manifest.lookup('issue', prompt) if manifest and not args.refresh_llm_cache else None
+    streamed = False
+    if organized_content is not None:
+        print("Prompt unchanged since last build, reusing LLM output.")
+    elif args.stream:
+        print("\nOrganized Content:")
+        chunks = []
+        for chunk in llm.stream(prompt):
+            print(chunk, end='', flush=True)
+            chunks.append(chunk)
+        print()
+        organized_content = ''.join(chunks)
+        streamed = True
+        stats = llm.last_stream_stats
+        if stats and not stats['cached']:
+            rate = f"{stats['tokens_per_sec']:.1f} tokens/s" if stats['tokens_per_sec'] else "n/a tokens/s"
+            print(f"{stats['backend']}: first token {stats['ttft']:.2f}s, "
+                  f"{stats['tokens']} tokens in {stats['elapsed']:.2f}s ({rate})")
+    else:
+        organized_content = llm.generate(prompt)
+    if manifest:
+        manifest.record('issue', prompt, organized_content)
+    return organized_content, streamed
+
+def generate_sections(llm, corpus, file_names, context_tokens=None, chunk_workers=4,
+                      manifest=None, refresh=False, classifier=None, theme=None):
+    """Generate the issue with one concurrent LLM call per planned section."""
+    content_types = detect_content_types(corpus, classifier)
+    print(f"Detected content types: {', '.join(content_types)}")
+    # A few relevant passages per section, and never more than the context window allows
+    context_tokens = context_tokens or llm.context_tokens()
+    excerpt_tokens = DEFAULT_EXCERPT_TOKENS
+    if context_tokens:
+        excerpt_tokens = min(excerpt_tokens, max(256, context_tokens - 1024))
+    sectioned = SectionedGenerator(llm, chunk_workers, excerpt_tokens, manifest, refresh,
+                                   classifier.taxonomy if classifier else None, theme)
+    return sectioned.generate(corpus, content_types, file_names)
+
+def print_token_usage(llm):
+    """Log the prompt and completion tokens used by LLM backend calls so far, and cache hits."""
+    usage = llm.usage_stats()
+    if usage['calls']:
+        print(f"LLM tokens: {usage['prompt_tokens']} prompt + {usage['completion_tokens']} completion "
+              f"over {usage['calls']} calls")
+    if usage['cached_calls']:
+        print(f"LLM responses served from cache: {usage['cached_calls']} (no tokens used)")
+
+def print_route_stats(llm):
+    """Log per-route calls, wins, error rate, latency and breaker state when routing."""
+    route_stats = getattr(llm.backend, 'route_stats', None)
+    if route_stats is None:
+        return
+    for stats in route_stats():
+        latency = (f"p50 {stats['p50']:.2f}s, p95 {stats['p95']:.2f}s" if stats['p50'] is not None
+                   else "no successful calls")
+        print(f"Route {stats['route']}: {stats['wins']}/{stats['calls']} answered, "
+              f"{stats['error_rate']:.0%} errors, {latency}, circuit {stats['state']}")
+    if llm.backend.hedges:
+        print(f"Hedged requests: {llm.backend.hedges}")
+
+def render_magazine(gen, content, output_path):
+    """Render content to PDF or HTML based on the output extension."""
+    if output_path.endswith('.pdf'):
+        gen.generate_pdf_reportlab(content, output_path)
+    elif output_path.endswith('.html'):
+        gen.generate_html(content, output_path)
+    else:
+        print("Unsupported output format. Use .pdf or .html")
+        return False
+    return True
+
+def render_if_changed(gen, content, output_path, theme, manifest=None):
+    """Render unless the manifest shows output_path already holds this content and theme."""
+    if manifest and manifest.render_is_current(output_path, content, theme):
+        print(f"Output unchanged, skipping render: {output_path}")
+        return True
+    if not render_magazine(gen, content, output_path):
+        return False
+    if manifest:
+        manifest.record_render(output_path, content, theme)
+    return True
 
 def main():
     print("Starting magazine maker...")
     parser = argparse.ArgumentParser(description="LLM-Based Magazine Maker")
     parser.add_argument('files', nargs='+', help='Input files (PDF, Word, images)')
     parser.add_argument('--output', default='magazine.pdf', help='Output file name')
-    parser.add_argument('--api-key', help='OpenRouter API key')
     parser.add_argument('--theme', default='professional',
                        choices=['professional', 'modern', 'academic', 'sports'],
                        help='Magazine theme (professional, modern, academic, sports)')
+    add_runtime_arguments(parser)
+    parser.add_argument('--stream', action='store_true',
+                       help='Print the LLM output as it is generated (not with --per-section)')
     args = parser.parse_args()
     print(f"Arguments parsed: files={args.files}, output={args.output}, theme={args.theme}")
+    start_profiling(args)
 
-    doc_parser = DocumentParser()
-    llm = LLMHandler(args.api_key)
+    doc_parser = create_document_parser(args)
+    llm = create_llm(args)
+    warming = warm_up(llm, args)
+    classifier = create_classifier(args)
     gen = MagazineGenerator(theme=args.theme)
-    all_text = ""
+    manifest = BuildManifest.for_output(args.output) if args.incremental else None
 
-    print("Parsing files...")
-    for file_path in args.files:
-        if os.path.exists(file_path):
-            try:
-                text = doc_parser.parse_file(file_path)
-                all_text += f"\n--- Content from {os.path.basename(file_path)} ---\n{text}\n"
-                print(f"Parsed: {file_path} ({len(text)} chars)")
-            except Exception as e:
-                print(f"Error parsing {file_path}: {e}")
-        else:
-            print(f"File not found: {file_path}")
+    print(f"Parsing files (jobs={args.jobs})...")
+    corpus = assemble_corpus(parse_files(args.files, doc_parser, args.jobs, manifest=manifest))
+    print(f"Total text length: {corpus.length}")
 
-    print(f"Total text length: {len(all_text)}")
-
-    # Analyze content types
-    content_types = analyze_content_type(all_text)
     file_names = [os.path.basename(fp) for fp in args.files]
-
-    print(f"Detected content types: {', '.join(content_types)}")
-
-    # Create dynamic prompt based on content analysis
-    prompt = create_dynamic_prompt(all_text, content_types, file_names)
-    print("Generated prompt, calling LLM...")
-    organized_content = llm.generate(prompt)
+    if warming:
+        warming.join()
+    streamed = False
+    if args.per_section:
+        organized_content = generate_sections(llm, corpus, file_names, args.context_tokens,
+                                              args.chunk_workers, manifest, args.refresh_llm_cache,
+                                              classifier, prompt_theme(args))
+    else:
+        organized_content, streamed = generate_issue(llm, corpus, file_names, args, manifest,
+                                                     classifier)
+    llm.close()
+    cache_stats = llm.cache_stats()
+    if cache_stats:
+        print(f"LLM cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+    print_token_usage(llm)
+    print_route_stats(llm)
 
     print("LLM response received, generating output...")
-    print("\nOrganized Content:")
-    print(organized_content)
+    if not streamed:
+        print("\nOrganized Content:")
+        print(organized_content)
 
     # Generate output
-    if args.output.endswith('.pdf'):
-        gen.generate_pdf_reportlab(organized_content, args.output)
-    elif args.output.endswith('.html'):
-        gen.generate_html(organized_content, args.output)
-    else:
-        print("Unsupported output format. Use .pdf or .html")
-
-    print(f"Magazine generated as: {args.output}")
+    if render_if_changed(gen, organized_content, args.output, args.theme, manifest):
+        print(f"Magazine generated as: {args.output}")
+    if manifest:
+        manifest.record_files(args.files)
+        manifest.save()
+    doc_parser.close()
+    finish_profiling(args)
 
 if __name__ == "__main__":
     main()
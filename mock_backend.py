@@ -0,0 +1,164 @@
+import json
+import time
+import random
+import asyncio
+import hashlib
+from llm import LLMBackend
+from cache import hash_text
+from tokens import estimate_tokens
+
+DEFAULT_SECTIONS = ['Event Overview', 'Highlights', 'Achievements & Winners', 'Future Plans']
+
+def prompt_sha256(prompt):
+    """Key used for recorded responses: SHA-256 hex digest of the UTF-8 prompt."""
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+class LatencyModel:
+    """Samples time-to-first-token and generation speed for simulated requests.
+
+    distribution is one of 'fixed', 'uniform', 'normal' or 'lognormal'; jitter
+    is the spread (half-width for uniform, standard deviation otherwise) as a
+    fraction of ttft.
+    """
+
+    def __init__(self, ttft=0.0, tokens_per_sec=None, distribution='fixed', jitter=0.0):
+        if distribution not in ('fixed', 'uniform', 'normal', 'lognormal'):
+            raise ValueError(f"Unsupported latency distribution: {distribution}")
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.distribution = distribution
+        self.jitter = jitter
+
+    def sample_ttft(self, rng):
+        if self.distribution == 'fixed' or not self.ttft:
+            return self.ttft
+        if self.distribution == 'uniform':
+            spread = self.ttft * self.jitter
+            return max(0.0, rng.uniform(self.ttft - spread, self.ttft + spread))
+        if self.distribution == 'normal':
+            return max(0.0, rng.gauss(self.ttft, self.ttft * self.jitter))
+        # lognormal with the requested median, long right tail like real backends
+        return rng.lognormvariate(0.0, self.jitter) * self.ttft
+
+    def token_delay(self):
+        return 1.0 / self.tokens_per_sec if self.tokens_per_sec else 0.0
+
+class MockBackend(LLMBackend):
+    """Offline, deterministic LLM stand-in for load tests and benchmarks.
+
+    Replays recorded responses when a recording matches the prompt. Otherwise
+    it synthesizes magazine output in the **Title**/**Section** format that
+    MagazineGenerator parses. Sections come from the prompt's REQUIRED
+    SECTIONS list and bullets from its content; per-section and title
+    prompts get just a section body or a title. Output and latency depend
+    only on the prompt and seed, so runs are reproducible.
+    """
+
+    name = 'mock'
+
+    def __init__(self, latency=None, recordings=None, seed=0, bullets_per_section=3,
+                 repeat_sections=1, model='mock-1'):
+        self.latency = latency or LatencyModel()
+        self.recordings = {}
+        if recordings:
+            self.load_recordings(recordings)
+        self.seed = seed
+        self.bullets_per_section = bullets_per_section
+        self.repeat_sections = repeat_sections
+        self.model = model
+
+    def load_recordings(self, path):
+        """Load responses from a JSON object {prompt_sha256: response} or a
+        list of {"prompt": ..., "response": ...} records."""
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        if isinstance(data, dict):
+            self.recordings.update(data)
+        else:
+            for record in data:
+                self.recordings[prompt_sha256(record['prompt'])] = record['response']
+
+    def _rng(self, prompt):
+        return random.Random(hash_text(self.seed, prompt))
+
+    @staticmethod
+    def _required_sections(prompt):
+        sections = []
+        in_sections = False
+        for line in prompt.split('\n'):
+            line = line.strip()
+            if line.startswith('REQUIRED SECTIONS'):
+                in_sections = True
+            elif in_sections and line.startswith('- '):
+                name = line[2:].split('(')[0].strip()
+                if name and name not in sections:
+                    sections.append(name)
+            elif in_sections and line:
+                break
+        return sections or DEFAULT_SECTIONS
+
+    @staticmethod
+    def _source_lines(prompt):
+        start = prompt.find('CONTENT TO ANALYZE:')
+        if start == -1:
+            start = prompt.find('SOURCE EXCERPTS:')
+        # Source content is the last block of the prompt
+        body = prompt[start:] if start != -1 else prompt
+        lines = (line.strip() for line in body.split('\n')[1:])
+        return [line.lstrip('-*• ').strip() for line in lines
+                if len(line) > 20 and not line.startswith('---')]
+
+    def synthesize(self, prompt):
+        """Build deterministic structured output from the prompt."""
+        recorded = self.recordings.get(prompt_sha256(prompt))
+        if recorded is not None:
+            return recorded
+        rng = self._rng(prompt)
+        lines = self._source_lines(prompt) or ['Details were shared by the organizing committee.']
+        if prompt.startswith('Suggest a title'):
+            return f"{rng.choice(['Campus', 'College', 'Student'])} Chronicle Magazine"
+        if '\nWrite the "' in prompt:
+            # One section of a per-section issue: body bullets only
+            return '\n'.join(f"- {rng.choice(lines)}" for _ in range(self.bullets_per_section))
+        parts = [f"**{rng.choice(['Campus', 'College', 'Student'])} Chronicle Magazine**"]
+        for round_number in range(self.repeat_sections):
+            for section in self._required_sections(prompt):
+                title = section if self.repeat_sections == 1 else f"{section} {round_number + 1}"
+                parts.append(f"\n**{title}**")
+                for _ in range(self.bullets_per_section):
+                    parts.append(f"- {rng.choice(lines)}")
+        parts.append("\n**Conclusion**\nThe term was full of achievements worth celebrating.")
+        return '\n'.join(parts)
+
+    def _words(self, text):
+        words = text.split(' ')
+        return [word + (' ' if index < len(words) - 1 else '') for index, word in enumerate(words)]
+
+    def _total_delay(self, prompt, text):
+        return self.latency.sample_ttft(self._rng(prompt)) + estimate_tokens(text) * self.latency.token_delay()
+
+    def generate(self, prompt):
+        text = self.synthesize(prompt)
+        delay = self._total_delay(prompt, text)
+        if delay:
+            time.sleep(delay)
+        return text
+
+    async def agenerate(self, prompt):
+        text = self.synthesize(prompt)
+        delay = self._total_delay(prompt, text)
+        if delay:
+            await asyncio.sleep(delay)
+        return text
+
+    def stream(self, prompt):
+        text = self.synthesize(prompt)
+        ttft = self.latency.sample_ttft(self._rng(prompt))
+        if ttft:
+            time.sleep(ttft)
+        token_delay = self.latency.token_delay()
+        for word in self._words(text):
+            if token_delay:
+                time.sleep(token_delay * max(1, estimate_tokens(word)))
+            yield word, None
+        yield '', estimate_tokens(text)
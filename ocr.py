@@ -0,0 +1,114 @@
+import queue
+import shlex
+import threading
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:  # fall back to one tesseract subprocess per image via pytesseract
+    tesserocr = None
+
+def parse_tesseract_config(config):
+    """Split a pytesseract-style config string into (psm, oem, variables)."""
+    psm = oem = None
+    variables = {}
+    args = shlex.split(config or '')
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        value = args[index + 1] if index + 1 < len(args) else None
+        if arg == '--psm' and value is not None:
+            psm = int(value)
+            index += 1
+        elif arg == '--oem' and value is not None:
+            oem = int(value)
+            index += 1
+        elif arg == '-c' and value is not None and '=' in value:
+            name, _, setting = value.partition('=')
+            variables[name] = setting
+            index += 1
+        index += 1
+    return psm, oem, variables
+
+class OCREngine:
+    """Pool of long-lived Tesseract instances reused across images.
+
+    With tesserocr installed, each worker holds a loaded PyTessBaseAPI, so the
+    language model is read once instead of once per image, and up to
+    `workers` threads can recognize at once since tesserocr releases the GIL.
+    Without tesserocr, or if it cannot load Tesseract, it falls back to
+    pytesseract, which starts a tesseract process per call.
+    """
+
+    def __init__(self, lang='eng', config='', workers=1):
+        self.lang = lang
+        self.config = config
+        self.workers = max(1, workers)
+        self.persistent = tesserocr is not None
+        self._apis = None
+        self._lock = threading.Lock()
+
+    def _create_api(self):
+        psm, oem, variables = parse_tesseract_config(self.config)
+        kwargs = {'lang': self.lang}
+        if psm is not None:
+            kwargs['psm'] = psm
+        if oem is not None:
+            kwargs['oem'] = oem
+        api = tesserocr.PyTessBaseAPI(**kwargs)
+        for name, value in variables.items():
+            api.SetVariable(name, value)
+        return api
+
+    def _pool(self):
+        """Return the queue of loaded instances, or None if tesserocr cannot load Tesseract."""
+        with self._lock:
+            if self._apis is None and self.persistent:
+                apis = queue.Queue()
+                try:
+                    for _ in range(self.workers):
+                        apis.put(self._create_api())
+                except Exception as e:  # e.g. no tessdata where tesserocr's libtesseract looks
+                    while not apis.empty():
+                        apis.get().End()
+                    print(f"Could not load Tesseract through tesserocr ({e}); using pytesseract")
+                    self.persistent = False
+                    return None
+                self._apis = apis
+            return self._apis
+
+    def image_to_string(self, image):
+        """OCR a PIL image."""
+        apis = self._pool() if self.persistent else None
+        if apis is None:
+            return pytesseract.image_to_string(image, lang=self.lang, config=self.config)
+        api = apis.get()
+        try:
+            api.SetImage(image)
+            return api.GetUTF8Text()
+        finally:
+            api.Clear()
+            apis.put(api)
+
+    def close(self):
+        """Release the loaded Tesseract instances."""
+        with self._lock:
+            if self._apis is not None:
+                while not self._apis.empty():
+                    self._apis.get().End()
+                self._apis = None
+
+_shared_engines = {}
+_shared_lock = threading.Lock()
+
+def get_shared_engine(lang='eng', config=''):
+    """Return this process's engine for (lang, config), creating it on first use.
+
+    Used by process-pool workers so each worker loads Tesseract once and
+    reuses it for every file or page it is given.
+    """
+    with _shared_lock:
+        engine = _shared_engines.get((lang, config))
+        if engine is None:
+            engine = _shared_engines[(lang, config)] = OCREngine(lang, config)
+        return engine
@@ -1,25 +1,198 @@
 import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 from PyPDF2 import PdfReader
 from docx import Document
 from PIL import Image
-import pytesseract
 from bs4 import BeautifulSoup
 import requests
+from cache import ParseCache, DEFAULT_CACHE_DIR, hash_text
+from profiling import profiled, span
+from preprocess import preprocess_image
+from ocr import OCREngine, get_shared_engine
+
+try:
+    from pdf2image import convert_from_path
+except ImportError:  # OCR of scanned PDFs is optional (also needs poppler installed)
+    convert_from_path = None
+
+# Bump whenever extraction output changes so cached text is invalidated
+PARSER_VERSION = "2"
+
+def parse_page_range(spec, page_count):
+    """Turn a 1-based spec like "1-5,8,10-" or an iterable of ints into sorted 0-based indexes."""
+    if spec is None:
+        return list(range(page_count))
+    if isinstance(spec, str):
+        indexes = set()
+        for part in spec.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            if '-' in part:
+                start, _, stop = part.partition('-')
+                first = int(start) if start else 1
+                last = int(stop) if stop else page_count
+                indexes.update(range(first - 1, min(last, page_count)))
+            else:
+                indexes.add(int(part) - 1)
+    else:
+        indexes = {int(page) - 1 for page in spec}
+    return sorted(index for index in indexes if 0 <= index < page_count)
+
+def _extract_pdf_pages(file_path, indexes):
+    """Extract text for the given 0-based page indexes; runs in worker processes."""
+    with open(file_path, 'rb') as file:
+        pdf = PdfReader(file)
+        return [pdf.pages[index].extract_text() or '' for index in indexes]
+
+def _ocr_pdf_page(file_path, page_number, settings, engine=None):
+    """Rasterize one PDF page and OCR it with engine, or the process's shared engine in workers.
+
+    Results are cached by a hash of the rendered page image, so an unchanged
+    scanned page is not OCR'd again even if other pages of the file changed.
+    """
+    image = convert_from_path(file_path, dpi=settings['dpi'], first_page=page_number,
+                              last_page=page_number, grayscale=True)[0]
+    cache = None
+    if settings['cache_dir']:
+        cache = ParseCache(settings['cache_dir'], settings['cache_max_bytes'])
+        key = hash_text('pdf-page-ocr', PARSER_VERSION, settings['dpi'], settings['lang'],
+                        settings['config'], hashlib.sha256(image.tobytes()).hexdigest())
+        text = cache.get(key)
+        if text is not None:
+            return text
+    engine = engine or get_shared_engine(settings['lang'], settings['config'])
+    text = engine.image_to_string(image)
+    if cache is not None:
+        cache.set(key, text)
+    return text
 
 class DocumentParser:
-    def __init__(self):
-        # Initialize Tesseract for OCR if needed
-        pass
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, use_cache=True,
+                 cache_max_bytes=256 * 1024 * 1024, ocr_lang='eng', ocr_config='',
+                 pdf_workers=1, pdf_parallel_min_pages=32,
+                 pdf_ocr=True, ocr_dpi=200, ocr_workers=1, ocr_min_chars=20,
+                 ocr_preset='balanced'):
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self.ocr_lang = ocr_lang
+        self.ocr_config = ocr_config
+        # Pages whose text layer has fewer characters than this are treated as scans
+        self.pdf_ocr = pdf_ocr
+        self.ocr_dpi = ocr_dpi
+        self.ocr_workers = ocr_workers
+        self.ocr_min_chars = ocr_min_chars
+        self.ocr_preset = ocr_preset
+        self.pdf_workers = pdf_workers
+        # Below this many pages, process start-up costs more than it saves
+        self.pdf_parallel_min_pages = pdf_parallel_min_pages
+        # Keep constructor arguments so worker processes can rebuild an equivalent parser
+        self.options = {
+            'cache_dir': cache_dir,
+            'use_cache': use_cache,
+            'cache_max_bytes': cache_max_bytes,
+            'ocr_lang': ocr_lang,
+            'ocr_config': ocr_config,
+            'pdf_workers': pdf_workers,
+            'pdf_parallel_min_pages': pdf_parallel_min_pages,
+            'pdf_ocr': pdf_ocr,
+            'ocr_dpi': ocr_dpi,
+            'ocr_workers': ocr_workers,
+            'ocr_min_chars': ocr_min_chars,
+            'ocr_preset': ocr_preset,
+        }
+        self.cache = ParseCache(cache_dir, cache_max_bytes) if use_cache else None
+        # Tesseract is loaded on first use and kept for every later image
+        self.ocr = OCREngine(ocr_lang, ocr_config)
 
-    def parse_pdf(self, file_path):
-        """Parse PDF and extract text."""
-        text = ""
+    def close(self):
+        """Release the persistent OCR engine."""
+        self.ocr.close()
+
+    def _cache_settings(self):
+        """Settings that affect extracted text and therefore the cache key."""
+        # Without pdf2image scanned pages are left empty, so installing it must invalidate them
+        pdf_ocr = self.pdf_ocr and convert_from_path is not None
+        return {'ocr_lang': self.ocr_lang, 'ocr_config': self.ocr_config,
+                'pdf_ocr': pdf_ocr, 'ocr_dpi': self.ocr_dpi, 'ocr_min_chars': self.ocr_min_chars,
+                'ocr_preset': self.ocr_preset}
+
+    def settings_key(self):
+        """Hash of the version and settings that shape extracted text, for records kept outside the cache."""
+        return hash_text(PARSER_VERSION, sorted(self._cache_settings().items()))
+
+    def iter_pdf_pages(self, file_path, pages=None):
+        """Yield (page_number, text) for each selected page, one page at a time.
+
+        pages is a 1-based spec such as "1-5,8" or an iterable of page numbers.
+        """
         with open(file_path, 'rb') as file:
             pdf = PdfReader(file)
-            for page in pdf.pages:
-                text += page.extract_text() + "\n"
-        return text
+            for index in parse_page_range(pages, len(pdf.pages)):
+                yield index + 1, pdf.pages[index].extract_text() or ''
+
+    def _parse_pdf_parallel(self, file_path, indexes):
+        """Extract contiguous page ranges in worker processes, preserving page order."""
+        workers = min(self.pdf_workers, len(indexes))
+        size = -(-len(indexes) // workers)
+        ranges = [indexes[i:i + size] for i in range(0, len(indexes), size)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for texts in pool.map(_extract_pdf_pages, [file_path] * len(ranges), ranges):
+                yield from texts
+
+    def _ocr_scanned_pages(self, file_path, page_texts):
+        """Replace pages without a usable text layer by OCR of the rendered page."""
+        missing = [index for index, (_, text) in enumerate(page_texts)
+                   if len(text.strip()) < self.ocr_min_chars]
+        if not missing:
+            return page_texts
+        if convert_from_path is None:
+            print(f"Warning: {len(missing)} pages of {file_path} have no text layer; "
+                  f"install pdf2image and poppler to OCR them")
+            return page_texts
+
+        settings = {
+            'dpi': self.ocr_dpi,
+            'lang': self.ocr_lang,
+            'config': self.ocr_config,
+            'cache_dir': self.cache_dir if self.cache is not None else None,
+            'cache_max_bytes': self.cache_max_bytes,
+        }
+        page_numbers = [page_texts[index][0] for index in missing]
+        print(f"OCR for {len(missing)} scanned pages of {os.path.basename(file_path)} at {self.ocr_dpi} DPI...")
+        if self.ocr_workers > 1 and len(missing) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.ocr_workers, len(missing))) as pool:
+                texts = list(pool.map(_ocr_pdf_page, [file_path] * len(missing), page_numbers,
+                                      [settings] * len(missing)))
+        else:
+            texts = [_ocr_pdf_page(file_path, page_number, settings, self.ocr) for page_number in page_numbers]
 
+        page_texts = list(page_texts)
+        for index, text in zip(missing, texts):
+            page_texts[index] = (page_texts[index][0], text)
+        return page_texts
+
+    @profiled('DocumentParser.parse_pdf')
+    def parse_pdf(self, file_path, pages=None):
+        """Parse PDF and extract text, optionally for a page range and across processes.
+
+        Pages without a text layer (scans) are rasterized and OCR'd when pdf_ocr is on.
+        """
+        page_texts = None
+        if self.pdf_workers > 1:
+            with open(file_path, 'rb') as file:
+                indexes = parse_page_range(pages, len(PdfReader(file).pages))
+            if len(indexes) >= self.pdf_parallel_min_pages:
+                page_texts = list(zip((index + 1 for index in indexes),
+                                      self._parse_pdf_parallel(file_path, indexes)))
+        if page_texts is None:
+            page_texts = list(self.iter_pdf_pages(file_path, pages))
+        if self.pdf_ocr:
+            page_texts = self._ocr_scanned_pages(file_path, page_texts)
+        return ''.join(text + "\n" for _, text in page_texts)
+
+    @profiled('DocumentParser.parse_word')
     def parse_word(self, file_path):
         """Parse Word document and extract text."""
         doc = Document(file_path)
@@ -28,12 +201,16 @@ class DocumentParser:
             text += para.text + "\n"
         return text
 
+    @profiled('DocumentParser.parse_image')
     def parse_image(self, file_path):
-        """Parse image and extract text using OCR."""
+        """Parse image and extract text using OCR after preprocessing with ocr_preset."""
         image = Image.open(file_path)
-        text = pytesseract.image_to_string(image)
+        image = preprocess_image(image, self.ocr_preset)
+        with span('ocr.tesseract', size=f"{image.width}x{image.height}"):
+            text = self.ocr.image_to_string(image)
         return text
 
+    @profiled('DocumentParser.parse_html')
     def parse_html(self, file_path):
         """Parse HTML and extract text."""
         with open(file_path, 'r', encoding='utf-8') as file:
@@ -41,6 +218,7 @@ class DocumentParser:
             text = soup.get_text()
         return text
 
+    @profiled('DocumentParser.parse_text')
     def parse_text(self, file_path):
         """Parse plain text file."""
         with open(file_path, 'r', encoding='utf-8') as file:
@@ -48,6 +226,17 @@ class DocumentParser:
         return text
 
     def parse_file(self, file_path):
+        """Parse file, serving unchanged inputs from the parse cache."""
+        if self.cache is None:
+            return self._parse_uncached(file_path)
+        key = self.cache.make_key(file_path, PARSER_VERSION, self._cache_settings())
+        text = self.cache.get(key)
+        if text is None:
+            text = self._parse_uncached(file_path)
+            self.cache.set(key, text)
+        return text
+
+    def _parse_uncached(self, file_path):
         """Parse file based on extension."""
         ext = os.path.splitext(file_path)[1].lower()
         if ext == '.pdf':
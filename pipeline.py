@@ -0,0 +1,102 @@
+import time
+import queue
+import threading
+
+_DONE = object()
+
+class Stage:
+    """A named pipeline step: func(value) -> value, run by `workers` threads."""
+
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+
+class StageTimer:
+    """Accumulates item counts and busy time per pipeline stage."""
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, items, elapsed):
+        with self._lock:
+            count, total = self.stages.get(stage, (0, 0.0))
+            self.stages[stage] = (count + items, total + elapsed)
+
+    def report(self, wall_time=None):
+        print("\nPipeline summary:")
+        print(f"{'Stage':<10} {'Items':>6} {'Busy s':>9} {'Items/s':>9}")
+        for stage, (count, total) in self.stages.items():
+            rate = count / total if total > 0 else 0.0
+            print(f"{stage:<10} {count:>6} {total:>9.2f} {rate:>9.2f}")
+        if wall_time is not None:
+            busy = sum(total for _, total in self.stages.values())
+            print(f"Wall time {wall_time:.2f}s for {busy:.2f}s of stage work")
+
+class Pipeline:
+    """Runs items through stages concurrently, connected by bounded queues.
+
+    Each stage has its own worker threads, so while one item waits on the
+    network in a later stage the next item is already being parsed. Bounded
+    queues apply back-pressure so a fast stage cannot run far ahead. A
+    failure in any stage is recorded for that item and skips its remaining
+    stages without stopping the other items.
+    """
+
+    def __init__(self, stages, queue_size=2):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.timer = StageTimer()
+
+    def _worker(self, stage, inbox, outbox, results, remaining, lock):
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            index, value = item
+            start = time.perf_counter()
+            try:
+                value = stage.func(value)
+            except Exception as e:
+                results[index] = (None, f"{stage.name}: {e}")
+                continue
+            finally:
+                self.timer.record(stage.name, 1, time.perf_counter() - start)
+            if outbox is None:
+                results[index] = (value, None)
+            else:
+                outbox.put((index, value))
+        # The last worker of a stage tells every worker of the next stage to stop
+        with lock:
+            remaining[stage.name] -= 1
+            last = remaining[stage.name] == 0
+        if last and outbox is not None:
+            for _ in range(self.stages[self.stages.index(stage) + 1].workers):
+                outbox.put(_DONE)
+
+    def run(self, items):
+        """Process items and return (value, error) pairs in input order."""
+        items = list(items)
+        results = [None] * len(items)
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        remaining = {stage.name: stage.workers for stage in self.stages}
+        lock = threading.Lock()
+        threads = []
+        for position, stage in enumerate(self.stages):
+            outbox = queues[position + 1] if position + 1 < len(self.stages) else None
+            for _ in range(stage.workers):
+                thread = threading.Thread(target=self._worker, daemon=True,
+                                          args=(stage, queues[position], outbox, results, remaining, lock))
+                thread.start()
+                threads.append(thread)
+
+        start = time.perf_counter()
+        for index, item in enumerate(items):
+            queues[0].put((index, item))
+        for _ in range(self.stages[0].workers):
+            queues[0].put(_DONE)
+        for thread in threads:
+            thread.join()
+        self.wall_time = time.perf_counter() - start
+        return results
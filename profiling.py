@@ -0,0 +1,124 @@
+import sys
+import json
+import time
+import cProfile
+import threading
+import functools
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows; peak RSS is then omitted
+    resource = None
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and KiB on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class Profiler:
+    """Collects named timing spans with wall time, CPU time, peak RSS and metadata.
+
+    Disabled by default so instrumented code pays only an attribute check.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.records = []
+        self._lock = threading.Lock()
+        self._cprofile = None
+        self._cprofile_path = None
+
+    def start(self, cprofile_path=None):
+        """Enable span collection and optionally a cProfile run dumped on stop()."""
+        self.enabled = True
+        if cprofile_path:
+            self._cprofile_path = cprofile_path
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def stop(self):
+        """Stop collection and write the cProfile dump if one was requested."""
+        self.enabled = False
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self._cprofile_path)
+            print(f"cProfile stats written to {self._cprofile_path}")
+            self._cprofile = None
+
+    def record(self, name, wall, cpu=None, **meta):
+        """Add a span measured elsewhere, e.g. in a worker process."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.records.append({'name': name, 'wall': wall, 'cpu': cpu,
+                                 'peak_rss_mb': peak_rss_mb(), **meta})
+
+    @contextmanager
+    def span(self, name, **meta):
+        """Time the enclosed block; callers may add fields to the yielded dict."""
+        if not self.enabled:
+            yield {}
+            return
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield meta
+        finally:
+            self.record(name, time.perf_counter() - wall_start,
+                        time.thread_time() - cpu_start, **meta)
+
+    def profiled(self, name=None):
+        """Decorator form of span()."""
+        def decorator(func):
+            span_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self):
+        """Aggregate spans by name in first-seen order."""
+        totals = {}
+        for record in self.records:
+            entry = totals.setdefault(record['name'], {'calls': 0, 'wall': 0.0, 'cpu': 0.0,
+                                                       'peak_rss_mb': None})
+            entry['calls'] += 1
+            entry['wall'] += record['wall']
+            entry['cpu'] += record['cpu'] or 0.0
+            if record['peak_rss_mb'] is not None:
+                entry['peak_rss_mb'] = max(entry['peak_rss_mb'] or 0.0, record['peak_rss_mb'])
+        return totals
+
+    def report(self):
+        """Print an aggregated table of spans."""
+        print("\nProfile:")
+        print(f"{'Span':<48} {'Calls':>5} {'Wall s':>9} {'CPU s':>9} {'Peak RSS MiB':>13}")
+        for name, entry in self.summary().items():
+            rss = f"{entry['peak_rss_mb']:.1f}" if entry['peak_rss_mb'] is not None else "n/a"
+            print(f"{name:<48} {entry['calls']:>5} {entry['wall']:>9.3f} {entry['cpu']:>9.3f} {rss:>13}")
+        for record in self.records:
+            extra = {k: v for k, v in record.items()
+                     if k not in ('name', 'wall', 'cpu', 'peak_rss_mb')}
+            if extra:
+                details = ', '.join(f"{k}={v}" for k, v in extra.items())
+                print(f"  {record['name']}: {details}")
+
+    def write_json(self, path):
+        """Write raw spans and the aggregated summary as JSON."""
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({'summary': self.summary(), 'spans': self.records}, file, indent=2)
+        print(f"Profile written to {path}")
+
+# Process-wide profiler used by the instrumented modules
+profiler = Profiler()
+span = profiler.span
+profiled = profiler.profiled
@@ -0,0 +1,108 @@
+import os
+import json
+
+PROMPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prompts')
+
+def format_plan(plan):
+    """Format (name, hint) pairs as the bullet list used under REQUIRED SECTIONS."""
+    return ''.join(f"\n- {name} ({hint})" if hint else f"\n- {name}" for name, hint in plan)
+
+class PromptTemplates:
+    """Prompt text and section plans loaded once from the prompts/ directory.
+
+    Issue prompts are laid out from most to least shared: the fixed
+    instructions first, then the plan for the detected content types and
+    theme, then the file list and content. Backends with prompt prefix caching
+    (OpenRouter, Ollama's kept-alive context) can then reuse the instruction
+    block across every call. Plan blocks are cached per (content types, theme).
+
+    A theme only adds a STYLE line when one is passed, which callers do on
+    request: it makes every LLM response theme-specific, so re-rendering an
+    issue in another theme could no longer reuse them.
+    """
+
+    def __init__(self, directory=PROMPT_DIR):
+        self.directory = directory
+        with open(os.path.join(directory, 'plans.json'), 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        self.plans = {content_type: [tuple(section) for section in sections]
+                      for content_type, sections in data['sections'].items()}
+        self.default_plan = [tuple(section) for section in data['default']]
+        self.conclusion = tuple(data['conclusion'])
+        self.themes = data.get('themes', {})
+        self.instructions = self._read('issue_instructions.txt')
+        self.plan_template = self._read('issue_plan.txt')
+        self.request_template = self._read('issue_request.txt')
+        self.section_template = self._read('section.txt')
+        self.title_template = self._read('title.txt')
+        self._plan_blocks = {}
+
+    def _read(self, name):
+        with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as file:
+            text = file.read()
+        return text[:-1] if text.endswith('\n') else text
+
+    def plan_sections(self, content_types):
+        """Return the (name, hint) section plan for the detected content types.
+
+        Sections shared by several types (e.g. Event Overview) appear once, at
+        their first position, with the first hint given for them.
+        """
+        plan, seen = [], set()
+        for content_type in content_types:
+            for name, hint in self.plans.get(content_type, []):
+                if name not in seen:
+                    seen.add(name)
+                    plan.append((name, hint))
+        return plan or list(self.default_plan)
+
+    def section_types(self, content_types):
+        """Map each planned section name to the first content type whose plan includes it."""
+        owners = {}
+        for content_type in content_types:
+            for name, _ in self.plans.get(content_type, []):
+                owners.setdefault(name, content_type)
+        return owners
+
+    def plan_block(self, content_types, theme=None):
+        """Return the content-type and theme part of an issue prompt, built once per combination."""
+        key = (tuple(content_types), theme)
+        block = self._plan_blocks.get(key)
+        if block is None:
+            block = self.plan_template.format(types=', '.join(content_types),
+                                              sections=format_plan(self.plan_sections(content_types)))
+            if theme in self.themes:
+                block += f"\n\n{self.style_line(theme)}"
+            self._plan_blocks[key] = block
+        return block
+
+    def style_line(self, theme):
+        """Return the 'STYLE: ...' line for theme, or '' for no or an unknown theme."""
+        return f"STYLE: {self.themes[theme]}" if theme in self.themes else ''
+
+    def section_prompt(self, section, hint, files, excerpts, theme=None):
+        """Return the prompt for one section, with its hint and optional style as a FOCUS/STYLE line."""
+        focus = f"FOCUS: {hint}\n" if hint else ""
+        if theme in self.themes:
+            focus += self.style_line(theme) + "\n"
+        return self.section_template.format(section=section, files=files, focus=focus, excerpts=excerpts)
+
+    def issue_prompt(self, pieces, content_types, file_names, theme=None):
+        """Join the issue prompt once, streaming the content from pieces."""
+        request = self.request_template.format(files=', '.join(file_names))
+        return ''.join([self.instructions, '\n\n', self.plan_block(content_types, theme), '\n\n',
+                        request, '\n', *pieces])
+
+    def shared_prefixes(self):
+        """Return the fixed leading blocks of issue and section prompts, for backend context priming."""
+        static = self.section_template[:self.section_template.index('{')]
+        return [self.instructions + '\n\n', static[:static.rfind('\n\n') + 2]]
+
+_templates = None
+
+def get_templates():
+    """Return the shared PromptTemplates, loading the data files on first use."""
+    global _templates
+    if _templates is None:
+        _templates = PromptTemplates()
+    return _templates
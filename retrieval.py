@@ -0,0 +1,127 @@
+import re
+import math
+from collections import Counter
+from summarizer import split_text
+from tokens import estimate_tokens
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'have', 'in', 'is',
+    'it', 'its', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'were', 'will', 'with',
+}
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+def tokenize(text):
+    """Lowercase words minus stopwords, with a plural 's' stripped so 'medals' matches 'medal'."""
+    terms = []
+    for word in _WORD_RE.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 4 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+def split_passages(segments, passage_tokens=200):
+    """Split (source, text) segments into (source, passage) pairs at paragraph breaks."""
+    passages = []
+    for source, text in segments:
+        for paragraph in re.split(r'\n\s*\n', text):
+            for piece in split_text(paragraph.strip(), passage_tokens):
+                passages.append((source, piece.strip()))
+    return passages
+
+class BM25Index:
+    """In-memory Okapi BM25 index over passages of the parsed input files.
+
+    Built locally from the corpus, with no network or model, so each prompt can
+    carry only the passages relevant to what it asks for.
+    """
+
+    def __init__(self, passages, k1=1.5, b=0.75):
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(tokenize(text)) for _, text in passages]
+        self.lengths = [sum(freqs.values()) for freqs in self.term_freqs]
+        self.tokens = [estimate_tokens(text) for _, text in passages]
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        document_freqs = Counter()
+        for freqs in self.term_freqs:
+            document_freqs.update(freqs.keys())
+        count = len(passages)
+        self.idf = {term: math.log(1 + (count - df + 0.5) / (df + 0.5))
+                    for term, df in document_freqs.items()}
+
+    @classmethod
+    def from_segments(cls, segments, passage_tokens=200):
+        return cls(split_passages(segments, passage_tokens))
+
+    @property
+    def total_tokens(self):
+        return sum(self.tokens)
+
+    def scores(self, query):
+        """Return the BM25 score of every passage for query."""
+        terms = [term for term in set(tokenize(query)) if term in self.idf]
+        scores = []
+        for freqs, length in zip(self.term_freqs, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            score = 0.0
+            for term in terms:
+                tf = freqs.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+    def ranked(self, query):
+        """Return indexes of passages matching query, best first."""
+        scores = self.scores(query)
+        return sorted((index for index, score in enumerate(scores) if score > 0),
+                      key=lambda index: -scores[index])
+
+    def select(self, query, budget_tokens):
+        """Return indexes of the best-scoring passages that fit in budget_tokens.
+
+        Passages are taken best-first, skipping any that would overflow the
+        budget. If nothing matches the query, the opening passages are used.
+        """
+        ranked = (self.ranked(query) if query else []) or range(len(self.passages))
+        chosen, used = [], 0
+        for index in ranked:
+            if chosen and used + self.tokens[index] > budget_tokens:
+                continue
+            chosen.append(index)
+            used += self.tokens[index]
+        return sorted(chosen)
+
+    def select_many(self, queries, budget_tokens):
+        """Select passages for several queries within one shared budget.
+
+        Queries take turns adding their best remaining passage, so each
+        section gets its most relevant material before any gets a second.
+        """
+        rankings = [iter(self.ranked(query)) for query in queries]
+        chosen, used = set(), 0
+        while rankings:
+            for ranking in list(rankings):
+                for index in ranking:
+                    if index not in chosen and used + self.tokens[index] <= budget_tokens:
+                        chosen.add(index)
+                        used += self.tokens[index]
+                        break
+                else:
+                    rankings.remove(ranking)
+        return sorted(chosen) or self.select(' '.join(queries), budget_tokens)
+
+    def segments(self, indexes):
+        """Group selected passages back into (source, text) segments in corpus order."""
+        grouped = []
+        for index in sorted(indexes):
+            source, text = self.passages[index]
+            if grouped and grouped[-1][0] == source:
+                grouped[-1][1].append(text)
+            else:
+                grouped.append((source, [text]))
+        return [(source, '\n\n'.join(texts)) for source, texts in grouped]
@@ -0,0 +1,449 @@
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from llm import LLMBackend, LLMError, ContextLengthError, DEFAULT_OPENROUTER_MODEL, DEFAULT_OLLAMA_MODEL
+from tokens import count_tokens, context_limit, completion_budget
+
+class OpenRouterBackend(LLMBackend):
+    """An OpenRouter model as a routable backend, sent through handler's pooled client."""
+
+    name = 'openrouter'
+
+    def __init__(self, handler, model=DEFAULT_OPENROUTER_MODEL):
+        self.handler = handler
+        self.model = model
+
+    @property
+    def context_tokens(self):
+        return self.handler.context_window or context_limit(self.model)
+
+    def generate(self, prompt):
+        return self.handler.generate_with_openrouter(prompt, self.model)
+
+    def stream(self, prompt):
+        for text in self.handler.stream_with_openrouter(prompt, self.model):
+            yield text, None
+
+    async def agenerate(self, prompt):
+        agenerate = getattr(self.handler, 'agenerate_with_openrouter', None)
+        if agenerate is None:
+            return await asyncio.to_thread(self.generate, prompt)
+        return await agenerate(prompt, self.model)
+
+    def close(self):
+        self.handler.close()
+
+    async def aclose(self):
+        aclose = getattr(self.handler, 'aclose', None)
+        if aclose is not None:
+            await aclose()
+
+class OllamaBackend(LLMBackend):
+    """A local Ollama model as a routable backend."""
+
+    name = 'ollama'
+
+    def __init__(self, handler, model=DEFAULT_OLLAMA_MODEL):
+        self.handler = handler
+        self.model = model
+
+    @property
+    def context_tokens(self):
+        # The handler sends num_ctx with every request, replacing the model's known window
+        options = self.handler.ollama_options
+        return options.get('num_ctx') or self.handler.context_window or context_limit(self.model)
+
+    def generate(self, prompt):
+        return self.handler.generate_with_ollama(prompt, self.model)
+
+    def stream(self, prompt):
+        for text in self.handler.stream_with_ollama(prompt, self.model):
+            yield text, None
+
+    async def agenerate(self, prompt):
+        agenerate = getattr(self.handler, 'agenerate_with_ollama', None)
+        if agenerate is None:
+            return await asyncio.to_thread(self.generate, prompt)
+        return await agenerate(prompt, self.model)
+
+    def close(self):
+        self.handler.close()
+
+    async def aclose(self):
+        aclose = getattr(self.handler, 'aclose', None)
+        if aclose is not None:
+            await aclose()
+
+class Route:
+    """A backend with rolling latency/error stats and a circuit breaker.
+
+    The breaker opens after failure_threshold consecutive failures, or when
+    more than max_error_rate of the last window calls failed. While open the
+    route is skipped; after cooldown seconds one trial call is let through
+    (half-open) and its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, backend, window=50, failure_threshold=3, max_error_rate=0.5,
+                 min_calls=10, cooldown=30.0):
+        self.backend = backend
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.failure_threshold = failure_threshold
+        self.max_error_rate = max_error_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.calls = 0
+        self.wins = 0
+        self._lock = threading.Lock()
+
+    @property
+    def label(self):
+        return f"{self.backend.name}:{self.backend.model}"
+
+    @property
+    def context_tokens(self):
+        """The backend's context_tokens if it has one, else the known window of its model."""
+        return getattr(self.backend, 'context_tokens', None) or context_limit(self.backend.model)
+
+    def fits(self, prompt_tokens):
+        """Whether a prompt of prompt_tokens leaves room for a completion in the model's window."""
+        return completion_budget(prompt_tokens, self.context_tokens) is not None
+
+    def error_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def percentile(self, fraction):
+        """Latency at fraction (0.5 = median) of recent successful calls, or None without data."""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def state(self, now=None):
+        """'closed', 'open' or 'half-open'."""
+        if self.opened_at is None:
+            return 'closed'
+        now = time.monotonic() if now is None else now
+        return 'half-open' if now - self.opened_at >= self.cooldown else 'open'
+
+    def acquire(self, early=False):
+        """Claim a call; False while the breaker is open or a half-open trial is in flight.
+
+        early=True lets an open breaker take its half-open trial before the
+        cooldown has passed.
+        """
+        with self._lock:
+            state = self.state()
+            if early and state == 'open':
+                state = 'half-open'
+            if state == 'open' or state == 'half-open' and self.trial_running:
+                return False
+            if state == 'half-open':
+                self.trial_running = True
+            self.calls += 1
+            return True
+
+    def record_success(self, elapsed):
+        with self._lock:
+            self.latencies.append(elapsed)
+            self.outcomes.append(True)
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.outcomes.append(False)
+            self.consecutive_failures += 1
+            self.trial_running = False
+            tripped = (self.consecutive_failures >= self.failure_threshold
+                       or len(self.outcomes) >= self.min_calls and self.error_rate() > self.max_error_rate)
+            # A failed half-open trial re-opens the breaker for another cooldown
+            if tripped or self.opened_at is not None:
+                if self.opened_at is None:
+                    print(f"Circuit open for {self.label} ({self.consecutive_failures} consecutive failures, "
+                          f"{self.error_rate():.0%} errors); retrying in {self.cooldown:g}s")
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """Give back a claim that ended without an outcome (cancelled or prompt too long)."""
+        with self._lock:
+            self.trial_running = False
+
+    def stats(self):
+        median, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {'route': self.label, 'state': self.state(), 'calls': self.calls, 'wins': self.wins,
+                'error_rate': self.error_rate(), 'p50': median, 'p95': p95}
+
+class BackendRouter(LLMBackend):
+    """Send each prompt to the fastest healthy of several backends.
+
+    Routes are ranked by the rolling median latency of recent successful
+    calls; routes not called yet come first, in configured order, so each
+    one gets measured, and routes that have only failed come last. Routes
+    whose circuit is open, or whose model's context window cannot hold the
+    prompt, are skipped, and a failed call moves on to the next route. If
+    every circuit is open, the one closest to retrying gets an early trial.
+    With hedge=True, if the chosen route has not answered by its p95
+    latency (hedge_delay until it has min_samples calls), the same prompt is
+    also sent to the next route and whichever answers first wins.
+
+    Use it as LLMHandler(backend=BackendRouter([...])) so caching, usage and
+    concurrency limits still apply.
+    """
+
+    name = 'router'
+
+    def __init__(self, backends, hedge=False, hedge_delay=10.0, min_samples=5, max_workers=16, **route_options):
+        if not backends:
+            raise ValueError("BackendRouter needs at least one backend")
+        self.routes = [Route(backend, **route_options) for backend in backends]
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.min_samples = min_samples
+        self.hedges = 0
+        self.max_workers = max_workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def model(self):
+        # Part of the response cache key; the window used for budgeting is context_tokens
+        return '|'.join(route.label for route in self.routes)
+
+    @property
+    def context_tokens(self):
+        """Largest known context window among the routes, so prompts fit at least one of them."""
+        limits = [route.context_tokens for route in self.routes]
+        return None if None in limits else max(limits)
+
+    def candidates(self, prompt):
+        """Routes whose model fits prompt, in the order to try them.
+
+        Routes not called yet come first, then measured routes by median
+        latency, then routes that have only failed. Routes with an open
+        circuit come last, the one closest to retrying first.
+        """
+        prompt_tokens = count_tokens(prompt)
+        fitting = [route for route in self.routes if route.fits(prompt_tokens)]
+        if not fitting:
+            raise ContextLengthError(f"Prompt is {prompt_tokens} tokens, too long for every routed model")
+        now = time.monotonic()
+        healthy = [route for route in fitting if route.state(now) != 'open']
+        untried = [route for route in healthy if not route.outcomes]
+        measured = sorted((route for route in healthy if route.latencies), key=lambda route: route.percentile(0.5))
+        failing = [route for route in healthy if route.outcomes and not route.latencies]
+        opened = sorted((route for route in fitting if route.state(now) == 'open'),
+                        key=lambda route: route.opened_at)
+        return untried + measured + failing + opened
+
+    def _hedge_after(self, route):
+        if len(route.latencies) < self.min_samples:
+            return self.hedge_delay
+        return route.percentile(0.95)
+
+    def _call(self, route, prompt):
+        """Run prompt on route, recording its latency or failure."""
+        start = time.perf_counter()
+        try:
+            response = route.backend.generate(prompt)
+        except ContextLengthError:
+            route.release()
+            raise
+        except Exception:
+            route.record_failure()
+            raise
+        route.record_success(time.perf_counter() - start)
+        return response
+
+    async def _acall(self, route, prompt):
+        start = time.perf_counter()
+        agenerate = getattr(route.backend, 'agenerate', None)
+        try:
+            if agenerate is not None:
+                response = await agenerate(prompt)
+            else:
+                response = await asyncio.to_thread(route.backend.generate, prompt)
+        except (ContextLengthError, asyncio.CancelledError):
+            route.release()
+            raise
+        except Exception:
+            route.record_failure()
+            raise
+        route.record_success(time.perf_counter() - start)
+        return response
+
+    def _first_route(self, remaining):
+        """Claim the first route to try, removing it from remaining, or None.
+
+        If every circuit is open, the route closest to retrying gets its
+        trial call early rather than the prompt failing outright.
+        """
+        for early in (False, True):
+            for route in remaining:
+                if route.acquire(early):
+                    remaining.remove(route)
+                    return route
+        return None
+
+    def _next_route(self, remaining):
+        """Pop and claim the next route whose breaker lets a call through, or None."""
+        while remaining:
+            route = remaining.pop(0)
+            if route.acquire():
+                return route
+        return None
+
+    def _won(self, route, hedged):
+        route.wins += 1
+        if hedged:
+            print(f"Hedged request answered first by {route.label}")
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='router')
+            return self._pool
+
+    def generate(self, prompt):
+        """Generate on the best route, hedging and falling back as configured.
+
+        A hedged call that loses keeps running in the background (threads
+        cannot be cancelled); its latency still feeds the route's stats.
+        """
+        remaining = self.candidates(prompt)
+        pool = self._executor()
+        pending = {}
+        errors = []
+        hedged = False
+        route = self._first_route(remaining)
+        if route is None:
+            raise LLMError("No LLM backend is available (all circuits open)")
+        pending[pool.submit(self._call, route, prompt)] = route
+        deadline = time.monotonic() + self._hedge_after(route)
+        while pending:
+            timeout = None
+            if self.hedge and not hedged and remaining:
+                timeout = max(0.0, deadline - time.monotonic())
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                route = self._next_route(remaining)
+                if route is not None:
+                    self.hedges += 1
+                    pending[pool.submit(self._call, route, prompt)] = route
+                continue
+            for future in done:
+                route = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    errors.append(f"{route.label}: {e}")
+                    continue
+                self._won(route, hedged)
+                return response
+            if not pending:
+                route = self._next_route(remaining)
+                if route is not None:
+                    print(f"Routing to {route.label} after: {errors[-1]}")
+                    pending[pool.submit(self._call, route, prompt)] = route
+                    deadline = time.monotonic() + self._hedge_after(route)
+        raise LLMError("All routed LLM backends failed: " + '; '.join(errors))
+
+    async def agenerate(self, prompt):
+        """Async generate(); a hedged call that loses is cancelled."""
+        remaining = self.candidates(prompt)
+        pending = {}
+        errors = []
+        hedged = False
+        route = self._first_route(remaining)
+        if route is None:
+            raise LLMError("No LLM backend is available (all circuits open)")
+        pending[asyncio.ensure_future(self._acall(route, prompt))] = route
+        deadline = time.monotonic() + self._hedge_after(route)
+        try:
+            while pending:
+                timeout = None
+                if self.hedge and not hedged and remaining:
+                    timeout = max(0.0, deadline - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    route = self._next_route(remaining)
+                    if route is not None:
+                        self.hedges += 1
+                        pending[asyncio.ensure_future(self._acall(route, prompt))] = route
+                    continue
+                for task in done:
+                    route = pending.pop(task)
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        errors.append(f"{route.label}: {e}")
+                        continue
+                    self._won(route, hedged)
+                    return response
+                if not pending:
+                    route = self._next_route(remaining)
+                    if route is not None:
+                        print(f"Routing to {route.label} after: {errors[-1]}")
+                        pending[asyncio.ensure_future(self._acall(route, prompt))] = route
+                        deadline = time.monotonic() + self._hedge_after(route)
+        finally:
+            for task in pending:
+                task.cancel()
+        raise LLMError("All routed LLM backends failed: " + '; '.join(errors))
+
+    def stream(self, prompt):
+        """Stream from the best route, moving on only if it fails before any output (no hedging)."""
+        remaining = self.candidates(prompt)
+        errors = []
+        route = self._first_route(remaining)
+        while True:
+            if route is None:
+                raise LLMError("All routed LLM backends failed: " + ('; '.join(errors) or "all circuits open"))
+            start = time.perf_counter()
+            started = False
+            try:
+                for chunk in route.backend.stream(prompt):
+                    started = True
+                    yield chunk
+            except ContextLengthError:
+                route.release()
+                raise
+            except Exception as e:
+                route.record_failure()
+                if started:
+                    raise
+                errors.append(f"{route.label}: {e}")
+                print(f"Routing to the next backend after: {errors[-1]}")
+                route = self._next_route(remaining)
+                continue
+            route.record_success(time.perf_counter() - start)
+            route.wins += 1
+            return
+
+    def close(self):
+        """Close every route's backend and the hedging thread pool."""
+        for route in self.routes:
+            route.backend.close()
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    async def aclose(self):
+        """Close the routes' clients bound to the running event loop."""
+        for route in self.routes:
+            aclose = getattr(route.backend, 'aclose', None)
+            if aclose is not None:
+                await aclose()
+
+    def route_stats(self):
+        """Per-route calls, wins, error rate, p50/p95 latency and breaker state."""
+        return [route.stats() for route in self.routes]
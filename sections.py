@@ -0,0 +1,119 @@
+import re
+from llm import run_prompts
+from retrieval import BM25Index
+from prompts import get_templates
+from classifier import CONTENT_KEYWORDS
+
+TITLE_WORDS = ['magazine', 'journal', 'chronicle', 'gazette', 'bulletin']
+
+# Source excerpts per section prompt; a section needs a few passages, not the corpus
+DEFAULT_EXCERPT_TOKENS = 500
+
+def plan_sections(content_types):
+    """Return the (name, hint) section plan for the detected content types (see prompts/plans.json)."""
+    return get_templates().plan_sections(content_types)
+
+def section_query(name, hint, content_type=None, taxonomy=None):
+    """Retrieval query for a section: its name and hint, plus the keywords of
+    the content type whose plan the section comes from.
+
+    Only the owning type's keywords are added; keywords shared by every
+    section would make them all rank the same passages.
+    """
+    taxonomy = taxonomy or CONTENT_KEYWORDS
+    return ' '.join([name, hint or ''] + list(taxonomy.get(content_type, [])))
+
+def format_excerpts(segments, header="--- From {source} ---"):
+    """Join (source, text) segments under a header line per source."""
+    return '\n\n'.join(f"{header.format(source=source)}\n{text}" for source, text in segments)
+
+def clean_title(text):
+    """Reduce a title response to one line the section parser recognizes as a title."""
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+    title = lines[0] if lines else ''
+    title = re.sub(r'^(title\s*:\s*)', '', title.strip('*#" '), flags=re.IGNORECASE).strip('*" ')
+    if not title:
+        title = 'Campus Magazine'
+    elif not any(word in title.lower() for word in TITLE_WORDS):
+        title += ' Magazine'
+    return title
+
+def clean_section(name, text):
+    """Strip a repeated header and **bold** lines that would be read as new sections."""
+    lines = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        plain = line.strip('*# ').rstrip(':').strip()
+        if not lines and plain.lower() == name.lower():
+            continue
+        if line.startswith('**') and line.endswith('**') or line.startswith('#'):
+            line = plain
+        lines.append(line)
+    return '\n'.join(lines)
+
+class SectionedGenerator:
+    """Generate an issue as one small prompt per section, run concurrently.
+
+    Each section prompt carries only the passages a BM25 index over the
+    corpus ranks as relevant to that section, so completions are short and
+    generated in parallel instead of one long serial completion capped by
+    max_tokens. Results are assembled into the
+    **Title** / **Section** format MagazineGenerator parses. With a
+    BuildManifest, each section is a unit ('section:<name>') that is reused
+    while its prompt is unchanged.
+    """
+
+    def __init__(self, llm, max_workers=4, excerpt_tokens=DEFAULT_EXCERPT_TOKENS, manifest=None, refresh=False,
+                 taxonomy=None, theme=None):
+        self.llm = llm
+        self.taxonomy = taxonomy
+        self.theme = theme
+        self.max_workers = max_workers
+        self.excerpt_tokens = excerpt_tokens
+        self.manifest = manifest
+        self.refresh = refresh
+
+    def build_prompts(self, segments, content_types, file_names):
+        """Return (unit, prompt) pairs: the title first, then each planned section."""
+        templates = get_templates()
+        files = ', '.join(file_names)
+        index = BM25Index.from_segments(segments)
+        opening = index.segments(index.select('', min(self.excerpt_tokens, 400)))
+        title = templates.title_template.format(files=files, types=', '.join(content_types),
+                                                excerpt=format_excerpts(opening))
+        prompts = [('title', title)]
+        owners = templates.section_types(content_types)
+        for name, hint in templates.plan_sections(content_types) + [templates.conclusion]:
+            selected = index.select(section_query(name, hint, owners.get(name), self.taxonomy),
+                                    self.excerpt_tokens)
+            excerpts = format_excerpts(index.segments(selected))
+            prompts.append((f"section:{name}",
+                            templates.section_prompt(name, hint, files, excerpts, self.theme)))
+        return prompts
+
+    def generate(self, segments, content_types, file_names):
+        """Generate every section concurrently and return the assembled content."""
+        prompts = self.build_prompts(segments, content_types, file_names)
+        outputs = {}
+        if self.manifest and not self.refresh:
+            for unit, prompt in prompts:
+                output = self.manifest.lookup(unit, prompt)
+                if output is not None:
+                    outputs[unit] = output
+        pending = [(unit, prompt) for unit, prompt in prompts if unit not in outputs]
+        reused = len(prompts) - len(pending)
+        print(f"Generating {len(pending)} sections concurrently"
+              + (f" ({reused} unchanged, reused)" if reused else "") + "...")
+        responses = run_prompts(self.llm, [prompt for _, prompt in pending], self.max_workers)
+        for (unit, prompt), response in zip(pending, responses):
+            outputs[unit] = response
+            if self.manifest:
+                self.manifest.record(unit, prompt, response)
+
+        parts = [f"**{clean_title(outputs['title'])}**"]
+        for unit, _ in prompts[1:]:
+            name = unit[len('section:'):]
+            parts.append(f"\n**{name}**\n{clean_section(name, outputs[unit])}")
+        return '\n'.join(parts)
@@ -0,0 +1,119 @@
+from llm import run_prompts
+from tokens import estimate_tokens, CHARS_PER_TOKEN
+
+MAP_PROMPT = """Extract every fact from the following excerpt of {source} (part {part} of {parts}).
+
+EXCERPT:
+{text}
+
+INSTRUCTIONS:
+- List names, dates, places, results, achievements, numbers and quotes as concise bullet points
+- Keep only information that appears in the excerpt - do not add anything
+- Fix obvious typos
+- Output bullet points only, no introduction or conclusion"""
+
+MERGE_PROMPT = """Merge the following bullet-point notes into one concise list.
+
+NOTES:
+{text}
+
+INSTRUCTIONS:
+- Remove duplicates but keep every distinct fact, name, date and number
+- Do not add information that is not in the notes
+- Output bullet points only"""
+
+def split_text(text, max_tokens):
+    """Split text into pieces of at most max_tokens, preferring paragraph then line breaks."""
+    if estimate_tokens(text) <= max_tokens:
+        return [text] if text.strip() else []
+
+    pieces = []
+    current = []
+    current_tokens = 0
+    for separator in ('\n\n', '\n'):
+        blocks = text.split(separator)
+        if len(blocks) > 1:
+            break
+    else:
+        # No line structure at all: fall back to fixed-size character windows
+        size = max_tokens * CHARS_PER_TOKEN
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    for block in blocks:
+        block_tokens = estimate_tokens(block)
+        if block_tokens > max_tokens:
+            if current:
+                pieces.append(separator.join(current))
+                current, current_tokens = [], 0
+            pieces.extend(split_text(block, max_tokens))
+            continue
+        if current and current_tokens + block_tokens > max_tokens:
+            pieces.append(separator.join(current))
+            current, current_tokens = [], 0
+        current.append(block)
+        current_tokens += block_tokens
+    if current:
+        pieces.append(separator.join(current))
+    return [piece for piece in pieces if piece.strip()]
+
+def chunk_segments(segments, max_tokens):
+    """Split (source, text) segments into (source, part, parts, text) chunks within max_tokens."""
+    chunks = []
+    for source, text in segments:
+        pieces = split_text(text, max_tokens)
+        for index, piece in enumerate(pieces):
+            chunks.append((source, index + 1, len(pieces), piece))
+    return chunks
+
+class MapReduceSummarizer:
+    """Summarize a corpus too large for one prompt by chunking, mapping and reducing."""
+
+    def __init__(self, llm, context_tokens=2048, max_workers=4, output_reserve=512):
+        self.llm = llm
+        self.context_tokens = context_tokens
+        self.max_workers = max_workers
+        # Leave room in the window for the instructions and the model's answer
+        overhead = estimate_tokens(MAP_PROMPT) + output_reserve
+        self.chunk_tokens = max(256, context_tokens - overhead)
+
+    def _run_all(self, prompts):
+        """Run prompts concurrently, returning responses in input order."""
+        return run_prompts(self.llm, prompts, self.max_workers)
+
+    def map(self, segments):
+        """Summarize each chunk of each segment into bullet-point notes."""
+        chunks = chunk_segments(segments, self.chunk_tokens)
+        print(f"Summarizing {len(chunks)} chunks (up to {self.chunk_tokens} tokens each)...")
+        prompts = [MAP_PROMPT.format(source=source, part=part, parts=parts, text=text)
+                   for source, part, parts, text in chunks]
+        summaries = self._run_all(prompts)
+        return [(source, summary) for (source, _, _, _), summary in zip(chunks, summaries)]
+
+    def _group(self, notes):
+        """Pack notes into groups whose combined size fits one merge prompt."""
+        groups, current, current_tokens = [], [], 0
+        for note in notes:
+            note_tokens = estimate_tokens(note)
+            if current and current_tokens + note_tokens > self.chunk_tokens:
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(note)
+            current_tokens += note_tokens
+        if current:
+            groups.append(current)
+        return groups
+
+    def reduce(self, summaries, build_prompt):
+        """Merge chunk summaries until build_prompt(notes) fits the context window."""
+        notes = [f"--- Notes from {source} ---\n{summary}" for source, summary in summaries]
+        while len(notes) > 1 and estimate_tokens(build_prompt('\n'.join(notes))) > self.context_tokens:
+            groups = self._group(notes)
+            if len(groups) == len(notes):
+                break  # every note already fills a merge prompt on its own
+            print(f"Merging {len(notes)} summaries into {len(groups)}...")
+            notes = self._run_all([MERGE_PROMPT.format(text='\n'.join(group)) for group in groups])
+        return build_prompt('\n'.join(notes))
+
+    def prepare_prompt(self, segments, build_prompt):
+        """Map segments to notes and return the final prompt built from the reduced notes."""
+        return self.reduce(self.map(segments), build_prompt)
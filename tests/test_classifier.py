@@ -0,0 +1,74 @@
+import re
+import json
+from collections import Counter
+import pytest
+from classifier import ContentClassifier, _trie_pattern, load_taxonomy
+
+def test_trie_pattern_factors_common_prefixes():
+    assert _trie_pattern(['art', 'artist', 'athlete']) == 'a(?:rt(?:ist)?|thlete)'
+    assert _trie_pattern(['event']) == 'event'
+
+def test_trie_pattern_matches_exactly_the_words():
+    pattern = re.compile(rf'^(?:{_trie_pattern(["art", "artist", "arts", "athlete"])})$')
+    for word in ['art', 'artist', 'arts', 'athlete']:
+        assert pattern.match(word)
+    for word in ['ar', 'artis', 'artists', 'athletes', '']:
+        assert not pattern.match(word)
+
+def test_keywords_match_whole_words_only():
+    classifier = ContentClassifier({'cultural': ['art']})
+    assert classifier.count('start of the startup') == Counter()
+    assert classifier.count('Art, arts and ART') == Counter({'cultural': 3})
+
+def test_plural_forms_are_counted():
+    classifier = ContentClassifier({'sports': ['medal'], 'infrastructure': ['facility']})
+    hits = classifier.count('Two medals and new facilities next to the facility')
+    assert hits == Counter({'sports': 1, 'infrastructure': 2})
+
+def test_keywords_ending_in_non_word_characters():
+    classifier = ContentClassifier({'languages': ['c++', 'c#']})
+    assert classifier.count('I like c++ and C#.') == Counter({'languages': 2})
+    assert classifier.count('c++x') == Counter()
+
+def test_short_y_keyword_gets_no_ies_form():
+    classifier = ContentClassifier({'letters': ['y']})
+    assert classifier.count('ies') == Counter()
+    assert classifier.count('x y z') == Counter({'letters': 1})
+
+def test_multi_word_keywords_match_any_whitespace():
+    classifier = ContentClassifier({'events': ['prize  giving']})
+    assert classifier.count('The prize giving ceremony') == Counter({'events': 1})
+
+def test_keyword_shared_by_categories_counts_for_each():
+    classifier = ContentClassifier({'a': ['award'], 'b': ['award']})
+    assert classifier.count('award') == Counter({'a': 1, 'b': 1})
+
+def test_classify_agrees_with_count_and_min_hits():
+    classifier = ContentClassifier(min_hits=2)
+    text = 'The tournament and the championship. One festival. A research seminar and workshop.'
+    assert classifier.classify(text) == classifier.types(classifier.count(text)) == ['sports', 'events']
+    assert classifier.classify('nothing relevant') == ['general']
+
+def test_classify_segments_totals_per_file():
+    classifier = ContentClassifier({'sports': ['medal']})
+    per_file, total = classifier.classify_segments([('a.txt', 'medal'), ('b.txt', 'medals medal'),
+                                                    ('a.txt', 'medal')])
+    assert per_file == {'a.txt': Counter({'sports': 2}), 'b.txt': Counter({'sports': 2})}
+    assert total == Counter({'sports': 4})
+
+def test_blank_keywords_are_ignored():
+    classifier = ContentClassifier({'sports': ['medal', '  ', '']})
+    assert classifier.count('the medal was won. s es') == Counter({'sports': 1})
+    assert ContentClassifier({'sports': [' ']}).classify('anything') == ['general']
+
+@pytest.mark.parametrize('keywords', [['medal', '  '], ['medal', ''], ['medal', 3]])
+def test_load_taxonomy_rejects_blank_or_non_string_keywords(tmp_path, keywords):
+    path = tmp_path / 'taxonomy.json'
+    path.write_text(json.dumps({'sports': keywords}))
+    with pytest.raises(ValueError, match='sports'):
+        load_taxonomy(str(path))
+
+def test_load_taxonomy(tmp_path):
+    path = tmp_path / 'taxonomy.json'
+    path.write_text(json.dumps({'sports': ['medal']}))
+    assert load_taxonomy(str(path)) == {'sports': ['medal']}
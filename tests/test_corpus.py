@@ -0,0 +1,44 @@
+from corpus import Corpus
+
+def make_corpus():
+    corpus = Corpus()
+    corpus.add('a.txt', 'first file', path='/in/a.txt')
+    corpus.add('b.txt', 'second\nfile')
+    corpus.add('c.txt', '')
+    return corpus
+
+def test_segment_offsets_index_the_joined_text():
+    corpus = make_corpus()
+    text = corpus.text()
+    assert corpus.length == len(text)
+    for segment in corpus.segments:
+        assert text[segment.start:segment.end] == segment.text
+        assert text[:segment.start].endswith(Corpus.HEADER.format(source=segment.source))
+
+def test_segment_at_finds_the_containing_segment():
+    corpus = make_corpus()
+    first, second, _ = corpus.segments
+    assert corpus.segment_at(first.start) is first
+    assert corpus.segment_at(first.end - 1) is first
+    assert corpus.segment_at(second.start + 3) is second
+
+def test_segment_at_outside_any_text():
+    corpus = make_corpus()
+    first, second, _ = corpus.segments
+    assert corpus.segment_at(0) is None  # inside the first header
+    assert corpus.segment_at(first.end) is None  # the newline after the first file
+    assert corpus.segment_at(second.start - 1) is None
+    assert corpus.segment_at(corpus.length) is None
+    assert Corpus().segment_at(0) is None
+
+def test_iteration_metadata_and_length():
+    corpus = make_corpus()
+    assert list(corpus) == [('a.txt', 'first file'), ('b.txt', 'second\nfile'), ('c.txt', '')]
+    assert len(corpus) == 3 and corpus
+    assert not Corpus()
+    assert corpus.segments[0].metadata == {'path': '/in/a.txt'}
+    assert ''.join(corpus.iter_text()) == corpus.text()
+
+def test_built_from_segments():
+    corpus = Corpus([('x', 'one'), ('y', 'two')])
+    assert corpus.text() == '\n--- Content from x ---\none\n\n--- Content from y ---\ntwo\n'
@@ -0,0 +1,29 @@
+import pytest
+from parser import parse_page_range
+
+def test_none_selects_every_page():
+    assert parse_page_range(None, 3) == [0, 1, 2]
+
+@pytest.mark.parametrize('spec, expected', [
+    ('1', [0]),
+    ('1-3', [0, 1, 2]),
+    ('1-3,5', [0, 1, 2, 4]),
+    ('8-', [7, 8, 9]),
+    ('-2', [0, 1]),
+    ('3,1,3', [0, 2]),
+    (' 2 , 4 ,', [1, 3]),
+])
+def test_string_specs(spec, expected):
+    assert parse_page_range(spec, 10) == expected
+
+def test_pages_beyond_the_document_are_dropped():
+    assert parse_page_range('4-20', 5) == [3, 4]
+    assert parse_page_range('0,6', 5) == []
+
+def test_iterable_of_page_numbers():
+    assert parse_page_range([3, 1, 3], 5) == [0, 2]
+    assert parse_page_range(range(4, 8), 5) == [3, 4]
+
+def test_invalid_spec_raises():
+    with pytest.raises(ValueError):
+        parse_page_range('a-b', 5)
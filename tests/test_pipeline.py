@@ -0,0 +1,46 @@
+import threading
+from pipeline import Pipeline, Stage
+
+def test_results_keep_input_order_across_workers():
+    pipeline = Pipeline([Stage('double', lambda x: x * 2, workers=3),
+                         Stage('inc', lambda x: x + 1, workers=2)])
+    assert pipeline.run(range(10)) == [(x * 2 + 1, None) for x in range(10)]
+
+def test_failure_is_recorded_with_stage_and_skips_later_stages():
+    seen = []
+    lock = threading.Lock()
+
+    def check(x):
+        if x == 2:
+            raise ValueError("bad item")
+        return x
+
+    def record(x):
+        with lock:
+            seen.append(x)
+        return x
+
+    results = Pipeline([Stage('check', check), Stage('record', record)]).run([1, 2, 3])
+    assert results == [(1, None), (None, 'check: bad item'), (3, None)]
+    assert sorted(seen) == [1, 3]
+
+def test_failure_in_last_stage_does_not_stop_other_items():
+    def render(x):
+        if x % 2:
+            raise RuntimeError(f"cannot render {x}")
+        return x
+
+    results = Pipeline([Stage('parse', str), Stage('render', lambda s: render(int(s)), workers=2)]).run(range(4))
+    assert results == [(0, None), (None, 'render: cannot render 1'), (2, None), (None, 'render: cannot render 3')]
+
+def test_timer_counts_every_item_including_failures():
+    def fail(x):
+        raise ValueError(x)
+
+    pipeline = Pipeline([Stage('ok', lambda x: x), Stage('fail', fail)])
+    pipeline.run(range(5))
+    assert pipeline.timer.stages['ok'][0] == 5
+    assert pipeline.timer.stages['fail'][0] == 5
+
+def test_empty_input():
+    assert Pipeline([Stage('a', lambda x: x, workers=2), Stage('b', lambda x: x)]).run([]) == []
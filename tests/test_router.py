@@ -0,0 +1,175 @@
+import time
+import asyncio
+import pytest
+from llm import LLMBackend, LLMError, ContextLengthError
+from types import SimpleNamespace
+from router import BackendRouter, Route, OllamaBackend, OpenRouterBackend
+
+class FakeBackend(LLMBackend):
+    def __init__(self, name, delay=0.0, fail=False, model=None):
+        self.name = name
+        self.model = model or name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def generate(self, prompt):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.name} failed")
+        return self.name
+
+    async def agenerate(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.name} failed")
+        return self.name
+
+def test_breaker_opens_after_consecutive_failures():
+    route = Route(FakeBackend('a'), failure_threshold=3, cooldown=60)
+    for _ in range(2):
+        assert route.acquire()
+        route.record_failure()
+    assert route.state() == 'closed'
+    assert route.acquire()
+    route.record_failure()
+    assert route.state() == 'open'
+    assert not route.acquire()
+
+def test_breaker_opens_on_error_rate():
+    route = Route(FakeBackend('a'), failure_threshold=100, max_error_rate=0.5, min_calls=4, cooldown=60)
+    for succeeded in [True, False, True, False]:
+        route.acquire()
+        route.record_success(0.1) if succeeded else route.record_failure()
+    assert route.state() == 'closed'  # 50% is not more than max_error_rate
+    route.acquire()
+    route.record_failure()
+    assert route.state() == 'open'
+
+def test_half_open_allows_one_trial_then_closes_on_success():
+    route = Route(FakeBackend('a'), failure_threshold=1, cooldown=0.05)
+    route.acquire()
+    route.record_failure()
+    assert route.state() == 'open'
+    time.sleep(0.06)
+    assert route.state() == 'half-open'
+    assert route.acquire()
+    assert not route.acquire()  # the trial is in flight
+    route.record_success(0.1)
+    assert route.state() == 'closed'
+    assert route.acquire()
+
+def test_failed_trial_reopens_for_another_cooldown():
+    route = Route(FakeBackend('a'), failure_threshold=1, cooldown=0.05)
+    route.acquire()
+    route.record_failure()
+    time.sleep(0.06)
+    assert route.acquire()
+    route.record_failure()
+    assert route.state() == 'open'
+    assert not route.acquire()
+
+def test_release_frees_the_trial_slot():
+    route = Route(FakeBackend('a'), failure_threshold=1, cooldown=0)
+    route.acquire()
+    route.record_failure()
+    assert route.acquire()
+    route.release()
+    assert route.acquire()
+
+def test_early_acquire_takes_the_trial_before_cooldown():
+    route = Route(FakeBackend('a'), failure_threshold=1, cooldown=60)
+    route.acquire()
+    route.record_failure()
+    assert not route.acquire()
+    assert route.acquire(early=True)
+    assert not route.acquire(early=True)
+
+def test_percentiles():
+    route = Route(FakeBackend('a'))
+    assert route.percentile(0.5) is None
+    for latency in range(1, 21):
+        route.record_success(latency / 10)
+    assert route.percentile(0.5) == 1.1
+    assert route.percentile(0.95) == 2.0
+
+def test_fastest_measured_route_is_chosen():
+    slow, fast = FakeBackend('slow', delay=0.03), FakeBackend('fast', delay=0.0)
+    router = BackendRouter([slow, fast])
+    assert [router.generate('p') for _ in range(2)] == ['slow', 'fast']  # each measured once
+    assert [router.generate('p') for _ in range(3)] == ['fast'] * 3
+
+def test_failure_falls_back_and_failing_route_ranks_last():
+    bad, good = FakeBackend('bad', fail=True), FakeBackend('good')
+    router = BackendRouter([bad, good], cooldown=60)
+    assert router.generate('p') == 'good'
+    assert [route.backend for route in router.candidates('p')] == [good, bad]
+    assert router.generate('p') == 'good'
+    assert bad.calls == 1
+
+def test_all_routes_failing_raises():
+    router = BackendRouter([FakeBackend('a', fail=True), FakeBackend('b', fail=True)])
+    with pytest.raises(LLMError, match='a failed.*b failed'):
+        router.generate('p')
+
+def test_all_circuits_open_gives_the_soonest_an_early_trial():
+    backend = FakeBackend('only', fail=True)
+    router = BackendRouter([backend], failure_threshold=2, cooldown=60)
+    for _ in range(2):
+        with pytest.raises(LLMError):
+            router.generate('p')
+    assert router.routes[0].state() == 'open'
+    backend.fail = False
+    assert router.generate('p') == 'only'
+    assert router.routes[0].state() == 'closed'
+
+def test_prompt_too_long_for_a_model_skips_that_route():
+    small, large = FakeBackend('small', model='tinyllama'), FakeBackend('large', model='unknown-model')
+    router = BackendRouter([small, large])
+    assert router.generate('word ' * 5000) == 'large'
+    assert small.calls == 0
+
+def test_ollama_route_uses_num_ctx_as_its_window():
+    handler = SimpleNamespace(ollama_options={'num_ctx': 8192}, context_window=None)
+    router = BackendRouter([OllamaBackend(handler, 'tinyllama')])
+    assert router.context_tokens == 8192
+    assert router.candidates('word ' * 3000) == router.routes  # ~3750 tokens
+    handler.ollama_options = {}
+    assert router.context_tokens == 2048
+    with pytest.raises(ContextLengthError):
+        router.candidates('word ' * 3000)
+
+def test_context_window_overrides_every_route():
+    handler = SimpleNamespace(ollama_options={}, context_window=8192)
+    router = BackendRouter([OllamaBackend(handler, 'tinyllama'), OpenRouterBackend(handler, 'unknown-model')])
+    assert [route.context_tokens for route in router.routes] == [8192, 8192]
+
+def test_hedge_sends_to_next_route_after_delay():
+    slow, fast = FakeBackend('slow', delay=0.5), FakeBackend('fast', delay=0.0)
+    router = BackendRouter([slow, fast], hedge=True, hedge_delay=0.05)
+    start = time.perf_counter()
+    assert router.generate('p') == 'fast'
+    assert time.perf_counter() - start < 0.4
+    assert router.hedges == 1
+    router.close()
+
+def test_no_hedge_when_primary_answers_in_time():
+    primary, backup = FakeBackend('primary', delay=0.0), FakeBackend('backup')
+    router = BackendRouter([primary, backup], hedge=True, hedge_delay=1.0)
+    assert router.generate('p') == 'primary'
+    assert router.hedges == 0 and backup.calls == 0
+
+def test_async_hedge_cancels_the_loser():
+    slow, fast = FakeBackend('slow', delay=0.5), FakeBackend('fast', delay=0.0)
+    router = BackendRouter([slow, fast], hedge=True, hedge_delay=0.05)
+    start = time.perf_counter()
+    assert asyncio.run(router.agenerate('p')) == 'fast'
+    assert time.perf_counter() - start < 0.4
+    slow_route = router.routes[0]
+    assert not slow_route.latencies and not slow_route.outcomes  # cancelled, not a failure
+
+def test_stream_falls_back_before_output():
+    router = BackendRouter([FakeBackend('bad', fail=True), FakeBackend('good')])
+    assert list(router.stream('p')) == [('good', None)]
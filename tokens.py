@@ -0,0 +1,70 @@
+import re
+
+try:
+    import tiktoken
+except ImportError:  # fall back to the character/word heuristic below
+    tiktoken = None
+
+# Rough average for English prose with BPE tokenizers (GPT/LLaMA families)
+CHARS_PER_TOKEN = 4
+
+# Context windows (prompt + completion) of the models we call by default
+MODEL_CONTEXT_TOKENS = {
+    'microsoft/wizardlm-2-8x22b': 65536,
+    'tinyllama': 2048,
+}
+
+# Completion length requested when the context window leaves room for it
+DEFAULT_MAX_TOKENS = 1000
+# A request is refused if the window cannot fit at least this much output
+MIN_COMPLETION_TOKENS = 256
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+_encoding = None
+
+def estimate_tokens(text):
+    """Estimate the token count of text without loading a tokenizer."""
+    if not text:
+        return 0
+    # Words and punctuation each cost at least one token; long words cost more
+    return max(len(_WORD_RE.findall(text)), len(text) // CHARS_PER_TOKEN)
+
+def _get_encoding():
+    global _encoding, tiktoken
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding('cl100k_base')
+        except Exception as e:  # e.g. the BPE file cannot be downloaded offline
+            print(f"tiktoken unavailable ({e}), estimating token counts instead")
+            tiktoken = None
+    return _encoding
+
+def count_tokens(text):
+    """Count tokens with tiktoken when installed, otherwise estimate_tokens().
+
+    cl100k_base is not the exact tokenizer of every model, but it is within a
+    few percent for English and much closer than the heuristic.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def context_limit(model):
+    """Return the context window of model in tokens, or None if unknown."""
+    return MODEL_CONTEXT_TOKENS.get(model)
+
+def completion_budget(prompt_tokens, context_tokens, max_tokens=DEFAULT_MAX_TOKENS):
+    """Return how many tokens to request for the completion, or None if the prompt does not fit.
+
+    The completion is capped at max_tokens and at whatever the context window
+    leaves after the prompt; with an unknown window max_tokens is used.
+    """
+    if context_tokens is None:
+        return max_tokens
+    available = context_tokens - prompt_tokens
+    if available < MIN_COMPLETION_TOKENS:
+        return None
+    return min(max_tokens, available)